@@ -2,31 +2,257 @@
 # Chess
 # Artificial Intelligence for Chess (console version)
 
+import asyncio
 import game_logic
-import time
+import json
+import os
 import random
+import threading
+import time
+from concurrent.futures import Future
 
 BEGINNER = 0
 INTERMEDIATE = 1
 HARD = 2
 
+# Search budget of each difficulty: (full-width plies, nodes). Node budgets don't depend on the machine's
+# speed, so a difficulty always plays the same moves and never uses more than its share of the CPU
+DIFFICULTY_BUDGETS = {BEGINNER: (1, 1000), INTERMEDIATE: (2, 5000), HARD: (4, 25000)}
+
+# Tuned piece values and piece-square tables (see tuner.py), loaded by AI() if the file exists
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.json')
+
+MATE_SCORE = 100000  # Score of being checkmated right now; mates further away score a little less
+INFINITY = MATE_SCORE + 1
+MAX_PLY = 128  # Deepest the full-width search can go from the root
+
+# Transposition table bounds
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Fischer valuation, in centipawns (the defaults; see Weights)
+PIECE_VALUES = {game_logic.Pawn: 100, game_logic.Knight: 300, game_logic.Bishop: 325, game_logic.Rook: 500,
+                game_logic.Queen: 900, game_logic.King: 0}
+
+# Piece-square bonuses in centipawns, by row * 8 + col from White's side of the board (row 0 is Black's back rank);
+# Black's Pieces use the square mirrored to their side (the defaults; see Weights)
+PIECE_SQUARE_TABLES = {
+    game_logic.Pawn: (0, 0, 0, 0, 0, 0, 0, 0,
+                      50, 50, 50, 50, 50, 50, 50, 50,
+                      10, 10, 20, 30, 30, 20, 10, 10,
+                      5, 5, 10, 25, 25, 10, 5, 5,
+                      0, 0, 0, 20, 20, 0, 0, 0,
+                      5, -5, -10, 0, 0, -10, -5, 5,
+                      5, 10, 10, -20, -20, 10, 10, 5,
+                      0, 0, 0, 0, 0, 0, 0, 0),
+    game_logic.Knight: (-50, -40, -30, -30, -30, -30, -40, -50,
+                        -40, -20, 0, 0, 0, 0, -20, -40,
+                        -30, 0, 10, 15, 15, 10, 0, -30,
+                        -30, 5, 15, 20, 20, 15, 5, -30,
+                        -30, 0, 15, 20, 20, 15, 0, -30,
+                        -30, 5, 10, 15, 15, 10, 5, -30,
+                        -40, -20, 0, 5, 5, 0, -20, -40,
+                        -50, -40, -30, -30, -30, -30, -40, -50),
+    game_logic.Bishop: (-20, -10, -10, -10, -10, -10, -10, -20,
+                        -10, 0, 0, 0, 0, 0, 0, -10,
+                        -10, 0, 5, 10, 10, 5, 0, -10,
+                        -10, 5, 5, 10, 10, 5, 5, -10,
+                        -10, 0, 10, 10, 10, 10, 0, -10,
+                        -10, 10, 10, 10, 10, 10, 10, -10,
+                        -10, 5, 0, 0, 0, 0, 5, -10,
+                        -20, -10, -10, -10, -10, -10, -10, -20),
+    game_logic.Rook: (0, 0, 0, 0, 0, 0, 0, 0,
+                      5, 10, 10, 10, 10, 10, 10, 5,
+                      -5, 0, 0, 0, 0, 0, 0, -5,
+                      -5, 0, 0, 0, 0, 0, 0, -5,
+                      -5, 0, 0, 0, 0, 0, 0, -5,
+                      -5, 0, 0, 0, 0, 0, 0, -5,
+                      -5, 0, 0, 0, 0, 0, 0, -5,
+                      0, 0, 0, 5, 5, 0, 0, 0),
+    game_logic.Queen: (-20, -10, -10, -5, -5, -10, -10, -20,
+                       -10, 0, 0, 0, 0, 0, 0, -10,
+                       -10, 0, 5, 5, 5, 5, 0, -10,
+                       -5, 0, 5, 5, 5, 5, 0, -5,
+                       0, 0, 5, 5, 5, 5, 0, -5,
+                       -10, 5, 5, 5, 5, 5, 0, -10,
+                       -10, 0, 5, 0, 0, 0, 0, -10,
+                       -20, -10, -10, -5, -5, -10, -10, -20),
+    game_logic.King: (-30, -40, -40, -50, -50, -40, -40, -30,
+                      -30, -40, -40, -50, -50, -40, -40, -30,
+                      -30, -40, -40, -50, -50, -40, -40, -30,
+                      -30, -40, -40, -50, -50, -40, -40, -30,
+                      -20, -30, -30, -40, -40, -30, -30, -20,
+                      -10, -20, -20, -20, -20, -20, -20, -10,
+                      20, 20, 0, 0, 0, 0, 20, 20,
+                      20, 30, 10, 0, 0, 10, 30, 20),
+}
+
+# Pawn structure, in centipawns
+DOUBLED_PAWN_PENALTY = 15  # For each Pawn on a file beyond the first
+ISOLATED_PAWN_PENALTY = 15  # For each Pawn with no friendly Pawns on the files next to it
+PASSED_PAWN_BONUS = (0, 5, 10, 20, 35, 60, 100, 0)  # By ranks advanced, for Pawns no enemy Pawn can stop
+PAWN_SHIELD_BONUS = (10, 5)  # For each Pawn one and two ranks in front of a King on its back rank
+
+NULL_MOVE_REDUCTION = 2  # How many extra plies shallower the null move is searched
+LATE_MOVE_INDEX = 3  # Quiet moves ordered after this many moves get reduced
+FUTILITY_MARGIN = 200  # Quiet moves one ply from the leaves that can't bring the eval within this of alpha are skipped
+_CAPTURE_ORDER = 1 << 30  # Captures are ordered before any quiet move, whatever its history score
+ASPIRATION_WINDOW = 50  # Iterative deepening first searches this far either side of the last iteration's score
+
+# Time management
+MOVES_TO_GO = 30  # Moves the rest of the clock is shared between when the time control doesn't say
+HARD_LIMIT_FACTOR = 4  # A move may take this many times its allocation (score drops, iterations that run long)...
+MAX_CLOCK_FRACTION = 0.5  # ... but never more than this fraction of what is left on the clock
+BRANCHING_FACTOR = 4  # Predicted ratio of an iteration's time to the last one's until two have been timed
+SCORE_DROP_MARGIN = 30  # An iteration scoring this much worse than the one before earns the move more time
+_LIMIT_CHECK_INTERVAL = 256  # Nodes between looks at the clock
+
+
+class Weights:
+    """
+    Piece values and piece-square tables of one evaluation
+    Each AI holds its own and hands them to its searches, so loading a weights file never changes the play of
+    another AI, or the module-level defaults
+    """
+    def __init__(self, piece_values: {type: int} = None, piece_square_tables: {type: (int,)} = None):
+        self.piece_values = dict(PIECE_VALUES if piece_values is None else piece_values)
+        self.piece_square_tables = dict(PIECE_SQUARE_TABLES if piece_square_tables is None else piece_square_tables)
+        self.exchange_values = dict(self.piece_values)  # Static exchange evaluation must never trade a King
+        self.exchange_values[game_logic.King] = 100 * self.piece_values[game_logic.Queen]
+        self.code_values = [0] * 8  # piece_values by Piece.code, for reading values straight off the mailbox
+        for piece_type, value in self.piece_values.items():
+            self.code_values[piece_type.code] = value
+
+
+DEFAULT_WEIGHTS = Weights()  # PIECE_VALUES and PIECE_SQUARE_TABLES
+
 
 class AI:
-    def __init__(self):
+    def __init__(self, difficulty: int = INTERMEDIATE, weights_file: str = WEIGHTS_FILE):
         # self._set_difficulty()
-        self.thinking_time = 3
+        # Tuned weights if there is a weights file (pass None to always play with the defaults)
+        if weights_file is not None and os.path.exists(weights_file):
+            self.weights = load_weights(weights_file)
+        else:
+            self.weights = DEFAULT_WEIGHTS
+        self.difficulty = difficulty
+        # Full-width plies (captures and promotions are searched further by quiescence) and nodes per move
+        self.search_depth, self.node_limit = DIFFICULTY_BUDGETS[difficulty]
+        self.null_move_pruning = True
+        self.late_move_reductions = True
+        self.futility_pruning = True
+        self.transposition_table = TranspositionTable()  # Kept between moves
+        self.pawn_cache = PawnCache()  # Kept between moves; the pawn structure hardly changes from one to the next
+        self.last_search = None  # Search used for the most recent move, for its node counts
+        self.principal_variation = []  # Line of packed moves the AI expects after its most recent move
+        self.telemetry = None  # Function called with a dict record for every iteration and search (see _report())
+        self.telemetry_file = None  # Path of a file to append the same records to as JSON lines, or None
         self.thinking_phrases = ["Thinking...", "Hey, what's that behind you?", "My turn? That was fast...",
                                  "Just give me a second!", "How do you play this game again..."]
 
-    def make_move(self, game_state: game_logic.GameState) -> (game_logic.Piece, int, int):
+    def make_move(self, game_state: game_logic.GameState, clock: float = None, increment: float = 0.0,
+                  moves_to_go: int = None) -> int:
         """
         Top level function that returns the AI's best decision
+        Without a clock the search is bounded only by the difficulty's depth and node budgets, and is deterministic
         :param game_state: GameState
-        :return: (Piece, row, col)
+        :param clock: seconds left on the AI's clock, or None for untimed play
+        :param increment: seconds added to the clock after each move
+        :param moves_to_go: moves left until the next time control, or None for sudden death
+        :return: packed move, which GameState.execute_move() accepts directly
         """
         self._print_thinking()
-        time.sleep(self.thinking_time)
-        return _get_random_move(game_state)
+        return self._search(game_state, self._new_search(), clock, increment, moves_to_go)
+
+    def start_search(self, game_state: game_logic.GameState, clock: float = None, increment: float = 0.0,
+                     moves_to_go: int = None, on_iteration=None) -> 'SearchHandle':
+        """
+        Non-blocking make_move(): search a snapshot of the position in a worker thread
+        Only one search per AI may run at a time, since they share the transposition table
+        :param game_state: GameState (may be changed while the search runs)
+        :param clock: seconds left on the AI's clock, or None for untimed play
+        :param increment: seconds added to the clock after each move
+        :param moves_to_go: moves left until the next time control, or None for sudden death
+        :param on_iteration: function of (depth, score, line) called from the worker thread after each completed
+                             iteration, e.g. to show the best move so far, or None
+        :return: SearchHandle
+        """
+        handle = SearchHandle(self._new_search(), on_iteration)
+        position = game_state.snapshot()
+        handle.start(lambda: self._search(position, handle.search, clock, increment, moves_to_go))
+        return handle
+
+    def _new_search(self) -> 'Search':
+        """Search with this AI's settings and node budget, sharing its transposition table"""
+        return Search(self.transposition_table, self.null_move_pruning, self.late_move_reductions,
+                      self.futility_pruning, self.node_limit, self.pawn_cache, self.weights)
+
+    def _search(self, game_state: game_logic.GameState, search: 'Search', clock: float, increment: float,
+                moves_to_go: int) -> int:
+        """
+        Run the search for make_move() and start_search()
+        :return: packed move
+        """
+        self.last_search = search
+        if clock is None:
+            move = search.best_move(game_state, self.search_depth)
+        else:
+            start = time.perf_counter()
+            soft, hard = allocate_time(clock, increment, moves_to_go)
+            move = search.best_move(game_state, self.search_depth, start + soft, start + hard)
+        self.principal_variation = search.principal_variation
+        if self.telemetry is not None or self.telemetry_file is not None:
+            self._report(game_state, search, move)
+        return move if move is not None else _get_random_move(game_state)
+
+    def _report(self, game_state: game_logic.GameState, search: 'Search', move: 'int or None') -> None:
+        """
+        Hand the telemetry of a search to self.telemetry and self.telemetry_file: one record per completed iteration
+        (see Search.iterations) followed by one for the whole search (see Search.summary())
+        Records are dicts of plain values with a 'type' of 'iteration' or 'search'; with start_search() they are
+        handed over from the worker thread
+        :param game_state: GameState that was searched
+        :param search: the finished Search
+        :param move: packed move it chose, or None
+        :return: None
+        """
+        context = {'difficulty': self.difficulty, 'fullmove_number': game_state.fullmove_number,
+                   'turn': 'white' if game_state.turn is game_logic.WHITE else 'black'}
+        records = [dict(context, type='iteration', **iteration) for iteration in search.iterations]
+        records.append(dict(context, type='search', move=move, **search.summary()))
+        if self.telemetry is not None:
+            for record in records:
+                self.telemetry(record)
+        if self.telemetry_file is not None:
+            with open(self.telemetry_file, 'a') as telemetry_file:
+                for record in records:
+                    telemetry_file.write(json.dumps(record) + '\n')
+
+    def analyse(self, game_state: game_logic.GameState, multipv: int = 3, depth: int = None,
+                time_limit: float = None) -> [(int, int, [int])]:
+        """
+        Find the best few moves for the side to move, each with its score and expected line
+        Each pass searches again with the moves already found left out at the root; the passes share
+        one Search, so the transposition table and move ordering data carry over from one to the next
+        :param game_state: GameState (left untouched)
+        :param multipv: how many moves to find
+        :param depth: full-width plies (defaults to self.search_depth)
+        :param time_limit: seconds after which no pass starts another iteration
+        :return: [(packed move, score, line of packed moves)], best first
+        """
+        search = Search(self.transposition_table, self.null_move_pruning, self.late_move_reductions,
+                        self.futility_pruning, pawn_cache=self.pawn_cache, weights=self.weights)
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        lines = []
+        for _ in range(multipv):
+            move = search.best_move(game_state, depth or self.search_depth, deadline)
+            if move is None:
+                break
+            lines.append((move, search.score, search.principal_variation))
+            search.excluded_moves.add(move)
+        self.last_search = search
+        return lines
 
     def _print_thinking(self) -> None:
         """
@@ -48,49 +274,644 @@ class AI:
     #             print("I say, good man! Please use proper language!")
 
 
-def _get_random_move(game_state: game_logic.GameState) -> (game_logic.Piece, int, int):
+def load_weights(path: str) -> Weights:
+    """
+    Read the piece values and piece-square tables of a weights file written by tuner.save_weights()
+    Pieces the file leaves out keep their default values
+    :param path: path of the JSON weights file
+    :return: Weights
+    """
+    with open(path) as weights_file:
+        weights = json.load(weights_file)
+    piece_values, piece_square_tables = dict(PIECE_VALUES), dict(PIECE_SQUARE_TABLES)
+    for piece_type in PIECE_SQUARE_TABLES:
+        name = piece_type.__name__
+        if name in weights.get('piece_values', {}) and piece_type is not game_logic.King:
+            piece_values[piece_type] = int(weights['piece_values'][name])
+        if name in weights.get('piece_square_tables', {}):
+            table = tuple(int(value) for value in weights['piece_square_tables'][name])
+            if len(table) != 64:
+                raise ValueError('Expected 64 {} piece-square values, got {}'.format(name, len(table)))
+            piece_square_tables[piece_type] = table
+    return Weights(piece_values, piece_square_tables)
+
+
+def allocate_time(clock: float, increment: float = 0.0, moves_to_go: int = None) -> (float, float):
+    """
+    Share the clock out between the moves left: the soft limit is what a move should normally take,
+    the hard limit what it may take when the search asks for more time
+    :param clock: seconds left
+    :param increment: seconds added after each move
+    :param moves_to_go: moves left until the next time control, or None for sudden death
+    :return: (soft limit, hard limit) in seconds
+    """
+    clock = max(clock, 0.0)
+    soft = clock / (moves_to_go or MOVES_TO_GO) + increment * 0.75
+    hard = min(soft * HARD_LIMIT_FACTOR, clock * MAX_CLOCK_FRACTION)
+    return min(soft, hard), hard
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when its node budget or hard time limit runs out, or it is stopped"""
+    pass
+
+
+class SearchHandle:
+    """
+    A search running in a worker thread (see AI.start_search())
+    Await it from asyncio code, or call result() to block until it finishes
+    """
+    def __init__(self, search: 'Search', on_iteration=None):
+        self.search = search
+        self._future = Future()
+        self._lock = threading.Lock()
+        self._best = None  # (packed move, score, depth, line) of the deepest completed iteration
+        self._thread = None
+        self._on_iteration = on_iteration  # Also told about each completed iteration, or None
+        search.on_iteration = self._publish
+
+    def __await__(self):
+        return asyncio.wrap_future(self._future).__await__()
+
+    def start(self, function) -> None:
+        """
+        Run function in a worker thread and make its return value (or exception) the result
+        :param function: function without arguments
+        :return: None
+        """
+        def run():
+            try:
+                self._future.set_result(function())
+            except BaseException as exception:
+                self._future.set_exception(exception)
+        self._thread = threading.Thread(target=run, name="ai-search", daemon=True)
+        self._thread.start()
+
+    def best_so_far(self) -> '(int, int, int, [int]) or None':
+        """
+        Best move found so far
+        :return: (packed move, score, depth, line of packed moves), or None before the first iteration completes
+        """
+        with self._lock:
+            return self._best
+
+    def stop(self) -> None:
+        """Ask the search to finish as soon as it has completed its first iteration"""
+        self.search.stop_requested = True
+
+    def done(self) -> bool:
+        """Whether the search has finished"""
+        return self._future.done()
+
+    def result(self, timeout: float = None) -> int:
+        """
+        Wait for the search to finish
+        :param timeout: seconds to wait, or None to wait as long as it takes
+        :return: packed move, which GameState.execute_move() accepts directly
+        """
+        return self._future.result(timeout)
+
+    def _publish(self, depth: int, score: int, line: [int]) -> None:
+        """Called by the search in the worker thread after each completed iteration"""
+        with self._lock:
+            self._best = (line[0] if line else None, score, depth, list(line))
+        if self._on_iteration is not None:
+            self._on_iteration(depth, score, line)
+
+
+class TranspositionTable:
+    """
+    Scores, bounds and best moves of searched positions, keyed by GameState.position_hash()
+    Once it is full, the oldest entries make room for new ones
+    """
+    def __init__(self, max_size: int = 200000):
+        self.max_size = max_size
+        self.probes = 0
+        self.hits = 0
+        self._entries = dict()  # {position hash: (depth, score, bound, best move)}, oldest first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def probe(self, key: int) -> 'tuple or None':
+        """Return (depth, score, bound, best move) for this position hash, or None"""
+        self.probes += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: 'int or None') -> None:
+        """Remember a search result, keeping the old best move if this search didn't find one"""
+        old = self._entries.pop(key, None)
+        if move is None and old is not None:
+            move = old[3]
+        elif len(self._entries) >= self.max_size:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (depth, score, bound, move)
+
+    def clear(self) -> None:
+        """Forget every position and reset the statistics"""
+        self._entries.clear()
+        self.probes = 0
+        self.hits = 0
+
+
+class PawnCache(game_logic.PositionCache):
+    """
+    Bounded LRU cache of pawn structure evaluations, keyed by GameState.pawn_key
+    Entries are (score, White's shields, Black's shields) from _pawn_structure()
+    Pawns move in few of the positions a search visits, so nearly every lookup is a hit
+    """
+    def __init__(self, max_size: int = 16384):
+        game_logic.PositionCache.__init__(self, max_size)
+
+
+class Search:
+    """
+    One iterative deepening, principal variation search of the game tree
+    Scores are in centipawns from the point of view of the side to move (negamax)
+    Full-width nodes and quiescence nodes are counted separately, as is the work of each selective technique,
+    so the nodes each one saves can be measured against any strength it loses
+    """
+    def __init__(self, transposition_table: TranspositionTable = None, null_move_pruning: bool = True,
+                 late_move_reductions: bool = True, futility_pruning: bool = True, node_limit: int = None,
+                 pawn_cache: PawnCache = None, weights: Weights = None):
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        self.pawn_cache = pawn_cache if pawn_cache is not None else PawnCache()
+        self.weights = weights if weights is not None else DEFAULT_WEIGHTS
+        self.null_move_pruning = null_move_pruning
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        self.node_limit = node_limit  # Full-width plus quiescence nodes after which the search stops, or None
+        self.hard_deadline = None  # time.perf_counter() value at which the search stops, or None
+        self.aborted = False  # Whether the last iteration was cut short by a limit
+        self.stop_requested = False  # Set from another thread to stop the search early
+        self.on_iteration = None  # Function called with (depth, score, line) after each completed iteration
+
+        self.nodes = 0  # Full-width nodes searched
+        self.qnodes = 0  # Quiescence nodes searched
+        self.exchange_pruned = 0  # Captures skipped in quiescence because they lose material
+        self.null_move_tries = 0  # Null move searches made
+        self.null_move_cutoffs = 0  # ... and how many of them failed high
+        self.late_move_reduced = 0  # Quiet moves searched at reduced depth
+        self.late_move_researched = 0  # ... and how many of them had to be searched again at full depth
+        self.futility_pruned = 0  # Quiet moves skipped near the leaves
+        self.pvs_researches = 0  # Null-window searches that failed high and were searched again with the full window
+        self.aspiration_researches = 0  # Iterations searched again because the score fell outside the window
+        self.beta_cutoffs = 0  # Full-width nodes that failed high...
+        self.first_move_cutoffs = 0  # ... and how many of them on their first move, a measure of move ordering
+        self.iterations = []  # Telemetry of each completed iteration (see best_move())
+        self._started = time.perf_counter()
+        self._table_start = (self.transposition_table.probes, self.transposition_table.hits)
+
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]  # Triangular PV table: best line found from each ply
+        self.history = dict()  # {from-to bits of a quiet move: how much it has caused cutoffs}, for move ordering
+        self.excluded_moves = set()  # Root moves to leave out (used by multi-PV analysis)
+        self.principal_variation = []  # Best line of the last completed iteration
+        self.score = 0  # ... its score
+        self.depth = 0  # ... and its depth
+
+    def best_move(self, game_state: game_logic.GameState, depth: int, soft_deadline: float = None,
+                  hard_deadline: float = None) -> 'int or None':
+        """
+        Search deeper and deeper up to the given depth, each iteration inside an aspiration window
+        around the score of the one before, and return the first move of the principal variation
+        An iteration isn't started if it is predicted to end after the soft deadline, which is pushed back
+        (up to the hard deadline) when the score drops. The node budget and the hard deadline cut an
+        iteration short, leaving the result of the last completed one; the first iteration always completes
+        :param game_state: GameState (left untouched)
+        :param depth: full-width plies
+        :param soft_deadline: time.perf_counter() value after which no new iteration is started, or None
+        :param hard_deadline: time.perf_counter() value at which the search stops, or None
+        :return: packed move, or None if there are no legal moves (besides excluded ones)
+        """
+        self.principal_variation = []
+        self.hard_deadline = hard_deadline
+        self.aborted = False
+        start = last_time = time.perf_counter()
+        iteration_times = []
+        counts = self._counts()
+        for current_depth in range(1, depth + 1):
+            if soft_deadline is not None and iteration_times:
+                if len(iteration_times) > 1 and iteration_times[-2] > 0:
+                    growth = max(2.0, iteration_times[-1] / iteration_times[-2])
+                else:
+                    growth = BRANCHING_FACTOR
+                if last_time + iteration_times[-1] * growth > soft_deadline:
+                    break
+            previous_score = self.score
+            try:
+                score = self._aspiration_search(game_state, current_depth, self.score)
+            except SearchAborted:
+                self.aborted = True
+                break
+            self.score = score
+            self.principal_variation = list(self.pv_table[0])
+            self.depth = current_depth
+            if self.on_iteration is not None:
+                self.on_iteration(current_depth, score, self.principal_variation)
+            now = time.perf_counter()
+            iteration_times.append(now - last_time)
+            self._record_iteration(current_depth, score, now - last_time, counts)
+            counts = self._counts()
+            last_time = now
+            if soft_deadline is not None and current_depth > 1 and score < previous_score - SCORE_DROP_MARGIN:
+                soft_deadline += soft_deadline - start  # Give the search time to find a way out
+                if hard_deadline is not None:
+                    soft_deadline = min(soft_deadline, hard_deadline)
+        self.hard_deadline = None
+        return self.principal_variation[0] if self.principal_variation else None
+
+    def _counts(self) -> (int, int, int, int, int, int):
+        """(nodes, quiescence nodes, beta cutoffs, first move cutoffs, table probes, table hits) so far"""
+        return (self.nodes, self.qnodes, self.beta_cutoffs, self.first_move_cutoffs,
+                self.transposition_table.probes, self.transposition_table.hits)
+
+    def _record_iteration(self, depth: int, score: int, seconds: float, before: tuple) -> None:
+        """
+        Add the telemetry of an iteration that just completed to self.iterations
+        :param depth: its depth
+        :param score: its score
+        :param seconds: how long it took
+        :param before: self._counts() when it started
+        :return: None
+        """
+        nodes, qnodes, cutoffs, first_cutoffs, probes, hits = (now - then for now, then in zip(self._counts(), before))
+        previous = self.iterations[-1]['nodes'] + self.iterations[-1]['qnodes'] if self.iterations else 0
+        self.iterations.append({
+            'depth': depth, 'score': score, 'seconds': seconds, 'nodes': nodes, 'qnodes': qnodes,
+            'nps': (nodes + qnodes) / seconds if seconds > 0 else 0.0,
+            'ebf': (nodes + qnodes) / previous if previous else None,  # Effective branching factor
+            'beta_cutoffs': cutoffs, 'first_move_cutoff_rate': first_cutoffs / cutoffs if cutoffs else None,
+            'tt_hit_rate': hits / probes if probes else None,
+        })
+
+    def summary(self) -> dict:
+        """
+        Telemetry of the whole search so far
+        :return: {name: number}
+        """
+        seconds = time.perf_counter() - self._started
+        probes = self.transposition_table.probes - self._table_start[0]
+        hits = self.transposition_table.hits - self._table_start[1]
+        return {
+            'depth': self.depth, 'score': self.score, 'aborted': self.aborted, 'seconds': seconds,
+            'nodes': self.nodes, 'qnodes': self.qnodes,
+            'nps': (self.nodes + self.qnodes) / seconds if seconds > 0 else 0.0,
+            'beta_cutoffs': self.beta_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else None,
+            'tt_probes': probes, 'tt_hit_rate': hits / probes if probes else None,
+            'tt_size': len(self.transposition_table),
+            'exchange_pruned': self.exchange_pruned, 'null_move_tries': self.null_move_tries,
+            'null_move_cutoffs': self.null_move_cutoffs, 'late_move_reduced': self.late_move_reduced,
+            'late_move_researched': self.late_move_researched, 'futility_pruned': self.futility_pruned,
+            'pvs_researches': self.pvs_researches, 'aspiration_researches': self.aspiration_researches,
+        }
+
+    def _check_limits(self) -> None:
+        """
+        Abort the search once it is over its node budget, past its hard deadline or asked to stop,
+        unless it hasn't completed an iteration yet
+        :return: None
+        """
+        if not self.principal_variation:
+            return
+        if self.stop_requested:
+            raise SearchAborted()
+        nodes = self.nodes + self.qnodes
+        if self.node_limit is not None and nodes >= self.node_limit:
+            raise SearchAborted()
+        if self.hard_deadline is not None and nodes % _LIMIT_CHECK_INTERVAL == 0 and \
+                time.perf_counter() >= self.hard_deadline:
+            raise SearchAborted()
+
+    def _aspiration_search(self, game_state: game_logic.GameState, depth: int, guess: int) -> int:
+        """
+        Search the root with a narrow window around the expected score, widening it on either side
+        whenever the score falls outside
+        :param game_state: GameState
+        :param depth: full-width plies
+        :param guess: expected score
+        :return: score
+        """
+        if depth == 1:
+            return self.negamax(game_state, depth, -INFINITY, INFINITY, 0)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = max(guess - delta, -INFINITY), min(guess + delta, INFINITY)
+        while True:
+            score = self.negamax(game_state, depth, alpha, beta, 0)
+            if score <= alpha and alpha > -INFINITY:
+                alpha = max(alpha - delta, -INFINITY)
+            elif score >= beta and beta < INFINITY:
+                beta = min(beta + delta, INFINITY)
+            else:
+                return score
+            self.aspiration_researches += 1
+            delta *= 2
+
+    def negamax(self, game_state: game_logic.GameState, depth: int, alpha: int, beta: int, ply: int,
+                allow_null: bool = True) -> int:
+        """
+        Fail-hard alpha-beta search that hands over to quiescence at depth 0
+        Uses null-move pruning, late move reductions and futility pruning where they are switched on
+        :param game_state: GameState
+        :param depth: full-width plies left
+        :param alpha: lower bound
+        :param beta: upper bound
+        :param ply: distance from the root, so that nearer mates score higher
+        :param allow_null: False right after a null move, so that two are never made in a row
+        :return: score
+        """
+        self.pv_table[ply] = []
+        if game_state.mate:
+            return -MATE_SCORE + ply
+        if game_state.stalemate:
+            return 0
+        if ply > 0 and (game_state.is_fifty_move_rule() or game_state.repetition_count() > 1):
+            return 0  # A position that repeats once can be repeated again, so it is scored as the draw it leads to
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(game_state, alpha, beta, ply)
+
+        self.nodes += 1
+        self._check_limits()
+        key = game_state.position_hash()
+        entry = self.transposition_table.probe(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_score, bound, tt_move = entry
+            entry_score = _score_from_table(entry_score, ply)
+            if ply > 0 and entry_depth >= depth and (bound == EXACT or
+                                                     (bound == LOWER_BOUND and entry_score >= beta) or
+                                                     (bound == UPPER_BOUND and entry_score <= alpha)):
+                return max(alpha, min(beta, entry_score))
+
+        in_check = game_state.check is game_state.turn
+        if self.null_move_pruning and allow_null and ply > 0 and not in_check and depth > NULL_MOVE_REDUCTION \
+                and abs(beta) < MATE_SCORE - MAX_PLY and not _is_zugzwang_prone(game_state):
+            self.null_move_tries += 1
+            score = -self.negamax(game_state.null_child(), depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                                  ply + 1, False)
+            if score >= beta:
+                self.null_move_cutoffs += 1
+                return beta
+
+        futile = self.futility_pruning and depth == 1 and not in_check and \
+            _heuristic(game_state, self.pawn_cache, self.weights) + FUTILITY_MARGIN <= alpha
+        moves = _ordered_moves(game_state, tt_move, self.history, self.weights)
+        if ply == 0 and self.excluded_moves:
+            moves = [move for move in moves if move not in self.excluded_moves]
+        best_move = None
+        for index, move in enumerate(moves):
+            next_state = game_state.child(move)
+            if index == 0:
+                score = -self.negamax(next_state, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                if _is_quiet(move) and not in_check and next_state.check is not next_state.turn:
+                    if futile:
+                        self.futility_pruned += 1
+                        continue
+                    if self.late_move_reductions and index >= LATE_MOVE_INDEX and depth >= 3:
+                        self.late_move_reduced += 1
+                        score = -self.negamax(next_state, depth - 2, -alpha - 1, -alpha, ply + 1)
+                        if score <= alpha:
+                            continue
+                        self.late_move_researched += 1
+                score = -self.negamax(next_state, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    self.pvs_researches += 1
+                    score = -self.negamax(next_state, depth - 1, -beta, -alpha, ply + 1)
+            if score >= beta:
+                self.beta_cutoffs += 1
+                if index == 0:
+                    self.first_move_cutoffs += 1
+                if _is_quiet(move):
+                    self.history[move & 0xFFF] = self.history.get(move & 0xFFF, 0) + depth * depth
+                if not (ply == 0 and self.excluded_moves):
+                    self.transposition_table.store(key, depth, _score_to_table(beta, ply), LOWER_BOUND, move)
+                return beta
+            if score > alpha:
+                alpha, best_move = score, move
+                self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+        if not (ply == 0 and self.excluded_moves):  # Scores with root moves left out aren't the position's scores
+            self.transposition_table.store(key, depth, _score_to_table(alpha, ply),
+                                           UPPER_BOUND if best_move is None else EXACT, best_move)
+        return alpha
+
+    def quiescence(self, game_state: game_logic.GameState, alpha: int, beta: int, ply: int) -> int:
+        """
+        Keep searching captures and promotions until the position is quiet, so the search doesn't stop
+        in the middle of an exchange (the horizon effect). Captures that lose material are skipped
+        :param game_state: GameState
+        :param alpha: lower bound
+        :param beta: upper bound
+        :param ply: distance from the root
+        :return: score
+        """
+        if game_state.mate:
+            return -MATE_SCORE + ply
+        if game_state.stalemate:
+            return 0
+
+        self.qnodes += 1
+        self._check_limits()
+        stand_pat = _heuristic(game_state, self.pawn_cache, self.weights)
+        if stand_pat >= beta:
+            return beta
+        alpha = max(alpha, stand_pat)
+
+        for move in _noisy_moves(game_state, self.weights):
+            if game_state.static_exchange(move, self.weights.exchange_values) < 0:
+                self.exchange_pruned += 1
+                continue
+            score = -self.quiescence(game_state.child(move), -beta, -alpha, ply + 1)
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        return alpha
+
+
+def _get_random_move(game_state: game_logic.GameState) -> int:
     """
     The AI simply makes a random-ish move.  Good for beginners.
     :param game_state: GameState
-    :return: (Piece, row, col)
+    :return: packed move
     """
-    for piece in game_state.all_possible_moves:
-        if piece.color is game_state.turn and len(game_state.all_possible_moves[piece]) > 0:
-            for coords in game_state.all_possible_moves[piece]:
-                return piece, coords[0], coords[1]
+    moves = game_state.legal_moves()
+    if moves:
+        return moves[0]
+
+
+def _ordered_moves(game_state: game_logic.GameState, first_move: int = None, history: {int: int} = None,
+                   weights: Weights = DEFAULT_WEIGHTS) -> [int]:
+    """
+    Legal moves for the side to move: first_move (e.g. from the transposition table) if it is legal,
+    then captures (most valuable victim, then least valuable attacker), then quiet moves by history score
+    :param game_state: GameState
+    :param first_move: packed move to try first, or None
+    :param history: {from-to bits: score} of quiet moves that caused cutoffs, or None
+    :param weights: Weights whose piece values rank the captures
+    :return: [packed move]
+    """
+    values, mailbox = weights.code_values, game_state.mailbox
+    scored = []
+    for move in game_state.legal_moves():
+        if (move >> 12) & game_logic.MOVE_CAPTURE:
+            order = _CAPTURE_ORDER + 10 * values[_victim_code(mailbox, move)] - \
+                values[mailbox[game_logic.MAILBOX_SQUARES[move & 0x3F]] & 7]
+        else:
+            order = history.get(move & 0xFFF, 0) if history else 0
+        scored.append((order, move))
+    scored.sort(key=lambda pair: -pair[0])
+    moves = [move for _, move in scored]
+    if first_move in moves:
+        moves.remove(first_move)
+        moves.insert(0, first_move)
+    return moves
+
+
+def _score_to_table(score: int, ply: int) -> int:
+    """Mate scores count plies from the root; the transposition table stores them counted from the position"""
+    if score > MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score < -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
 
+def _score_from_table(score: int, ply: int) -> int:
+    """Undo _score_to_table() for a position found at this ply"""
+    if score > MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score < -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
 
-def _heuristic(game_state: game_logic.GameState) -> int:
+
+def _noisy_moves(game_state: game_logic.GameState, weights: Weights = DEFAULT_WEIGHTS) -> [int]:
     """
-    This is where the AI traverses the tree of moves and decides which is best.
-    Returns an eval value that is then compared to many other eval values through recursive traversal.
+    Captures and promotions for the side to move, picked out of the legal moves by their flags
+    Ordered most valuable victim first (a Queen for promotions), then least valuable attacker
     :param game_state: GameState
+    :param weights: Weights whose piece values rank the moves
+    :return: [packed move]
+    """
+    values, mailbox = weights.code_values, game_state.mailbox
+    scored = []
+    for move in game_state.legal_moves():
+        if not _is_quiet(move):
+            victim = _victim_code(mailbox, move) if (move >> 12) & game_logic.MOVE_CAPTURE else game_logic.Queen.code
+            scored.append((10 * values[victim] - values[mailbox[game_logic.MAILBOX_SQUARES[move & 0x3F]] & 7], move))
+    scored.sort(key=lambda pair: -pair[0])
+    return [move for _, move in scored]
+
+
+def _victim_code(mailbox: bytearray, move: int) -> int:
+    """Piece.code of the Piece a packed capture takes, which for en passant is not on its to square"""
+    if move >> 12 == game_logic.MOVE_EN_PASSANT:
+        return game_logic.Pawn.code
+    return mailbox[game_logic.MAILBOX_SQUARES[(move >> 6) & 0x3F]] & 7
+
+
+def _is_quiet(move: int) -> bool:
+    """Is this packed move neither a capture nor a promotion?"""
+    return not (move >> 12) & (game_logic.MOVE_CAPTURE | game_logic.MOVE_PROMOTION)
+
+
+def _is_zugzwang_prone(game_state: game_logic.GameState) -> bool:
+    """
+    Endgames where the side to move has nothing but its King and Pawns are where passing would
+    often be the best move, so null-move pruning can't be trusted there
+    :param game_state: GameState
+    :return: bool
+    """
+    for piece in game_state.pieces:
+        if piece.color is game_state.turn and not isinstance(piece, (game_logic.Pawn, game_logic.King)):
+            return False
+    return True
+
+
+def _heuristic(game_state: game_logic.GameState, pawn_cache: PawnCache = None,
+               weights: Weights = DEFAULT_WEIGHTS) -> int:
+    """
+    Static score of a position for the search to compare (mate and stalemate are handled by the search itself)
+    :param game_state: GameState
+    :param pawn_cache: PawnCache for the pawn structure terms, or None to work them out every time
+    :param weights: Weights to evaluate with
     :return: int
     """
-    return _simple_eval(game_state)
+    return _simple_eval(game_state, pawn_cache, weights)
 
 
-def _simple_eval(game_state: game_logic.GameState) -> int:
+def _simple_eval(game_state: game_logic.GameState, pawn_cache: PawnCache = None,
+                 weights: Weights = DEFAULT_WEIGHTS) -> int:
     """
     Returns an arbitrary point value that judges the current state of the game.
     Note: evals like this don't care about checkmate or check; that's the heuristic's job.
-    Current point system used: Fischer valuation
+    Current point system used: Fischer valuation, piece-square tables and pawn structure, in centipawns
     :param game_state: GameState
+    :param pawn_cache: PawnCache for the pawn structure terms, or None to work them out every time
+    :param weights: Weights to evaluate with
     :return: int
     """
+    piece_values, piece_square_tables = weights.piece_values, weights.piece_square_tables
     points = 0
+    kings = dict()
     for piece in game_state.pieces:
-        piece_value = 1
-        if isinstance(piece, game_logic.Knight):
-            piece_value = 3
-        elif isinstance(piece, game_logic.Bishop):
-            piece_value = 3.25
-        elif isinstance(piece, game_logic.Rook):
-            piece_value = 5
-        elif isinstance(piece, game_logic.Queen):
-            piece_value = 9
-
+        if type(piece) is game_logic.King:
+            kings[piece.color] = piece
+        if piece.color is game_logic.WHITE:
+            piece_value = piece_values[type(piece)] + piece_square_tables[type(piece)][piece.row * 8 + piece.col]
+        else:
+            piece_value = piece_values[type(piece)] + piece_square_tables[type(piece)][(7 - piece.row) * 8 + piece.col]
         if piece.color is not game_state.turn:
             piece_value = -piece_value
         points += piece_value
-    return points
+
+    entry = pawn_cache.get(game_state.pawn_key) if pawn_cache is not None else None
+    if entry is None:
+        entry = _pawn_structure(game_state)
+        if pawn_cache is not None:
+            pawn_cache.put(game_state.pawn_key, entry)
+    pawn_points, shields = entry[0], {game_logic.WHITE: entry[1], game_logic.BLACK: entry[2]}
+    for color, back_rank in ((game_logic.WHITE, 7), (game_logic.BLACK, 0)):
+        king = kings.get(color)
+        if king is not None and king.row == back_rank:
+            pawn_points += color * shields[color][king.col]
+    return points + pawn_points * game_state.turn
+
+
+def _pawn_structure(game_state: game_logic.GameState) -> (int, (int,), (int,)):
+    """
+    Score the Pawns alone: doubled, isolated and passed Pawns, and the shield each side's Pawns
+    would give its King on each file of its back rank
+    :param game_state: GameState
+    :return: (score from White's point of view, White's shield by King column, Black's shield by King column)
+    """
+    files = {game_logic.WHITE: [[] for _ in range(8)], game_logic.BLACK: [[] for _ in range(8)]}
+    for piece in game_state.pieces:
+        if type(piece) is game_logic.Pawn:
+            files[piece.color][piece.col].append(piece.row)
+
+    points = 0
+    shields = dict()
+    for color, back_rank in ((game_logic.WHITE, 7), (game_logic.BLACK, 0)):
+        start_row = back_rank - color
+        own, enemy = files[color], files[-color]
+        for col in range(8):
+            rows = own[col]
+            if not rows:
+                continue
+            neighbours = range(max(col - 1, 0), min(col + 2, 8))
+            points -= color * DOUBLED_PAWN_PENALTY * (len(rows) - 1)
+            if not any(own[other] for other in neighbours if other != col):
+                points -= color * ISOLATED_PAWN_PENALTY * len(rows)
+            for row in rows:
+                # Enemy Pawns ahead of this one (a lower row for White) on this or a neighbouring file stop it
+                if not any((enemy_row - row) * color < 0 for other in neighbours for enemy_row in enemy[other]):
+                    points += color * PASSED_PAWN_BONUS[(start_row - row) * color]
+        shields[color] = tuple(sum(bonus for other in range(max(col - 1, 0), min(col + 2, 8))
+                                   for distance, bonus in enumerate(PAWN_SHIELD_BONUS, 1)
+                                   if back_rank - color * distance in own[other])
+                               for col in range(8))
+    return points, shields[game_logic.WHITE], shields[game_logic.BLACK]
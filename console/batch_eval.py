@@ -0,0 +1,148 @@
+# Kian Farsany
+# Chess
+# NumPy evaluation of many positions at once, giving exactly the scores of ai._simple_eval()
+
+import numpy as np
+import ai
+import game_logic
+
+# Order of the planes in (N, 12, 64) input: White's Pawns, Knights, Bishops, Rooks, Queens, King, then Black's
+PLANE_TYPES = (game_logic.Pawn, game_logic.Knight, game_logic.Bishop, game_logic.Rook, game_logic.Queen,
+               game_logic.King)
+_PLANE_CODES = np.array([piece_type.code | bit for bit in (game_logic.WHITE_BIT, game_logic.BLACK_BIT)
+                         for piece_type in PLANE_TYPES], dtype=np.uint8)
+_MAILBOX_SQUARES = np.array([game_logic._to_mailbox(row, col) for row in range(8) for col in range(8)])
+_WHITE_PAWN = game_logic.Pawn.code | game_logic.WHITE_BIT
+_BLACK_PAWN = game_logic.Pawn.code | game_logic.BLACK_BIT
+_WHITE_KING = game_logic.King.code | game_logic.WHITE_BIT
+_BLACK_KING = game_logic.King.code | game_logic.BLACK_BIT
+
+
+def _build_square_values(weights: ai.Weights) -> np.ndarray:
+    """
+    Material plus piece-square bonus of every piece code on every square, from White's point of view
+    :param weights: ai.Weights to evaluate with
+    :return: (32, 64) int64 array indexed by [piece code, row * 8 + col]
+    """
+    values = np.zeros((32, 64), dtype=np.int64)
+    for piece_type in PLANE_TYPES:
+        table = np.array(weights.piece_square_tables[piece_type], dtype=np.int64).reshape(8, 8)
+        value = weights.piece_values[piece_type]
+        values[piece_type.code | game_logic.WHITE_BIT] = value + table.ravel()
+        values[piece_type.code | game_logic.BLACK_BIT] = -(value + table[::-1].ravel())
+    return values
+
+
+def _build_serial_codes() -> np.ndarray:
+    """
+    Piece code of every square byte written by GameState.to_bytes() (bits 0-2 piece type, bit 3 Black)
+    :return: (256,) uint8 array
+    """
+    codes = np.zeros(256, dtype=np.uint8)
+    for byte in range(256):
+        if byte & 7:
+            codes[byte] = byte & 7 | (game_logic.BLACK_BIT if byte & 8 else game_logic.WHITE_BIT)
+    return codes
+
+
+_SERIAL_CODES = _build_serial_codes()
+# Passed Pawn bonus by row, indexed exactly as ai._pawn_structure() indexes it
+_WHITE_PASSED = np.array([ai.PASSED_PAWN_BONUS[6 - row] for row in range(8)], dtype=np.int64)
+_BLACK_PASSED = np.array([ai.PASSED_PAWN_BONUS[row - 1] for row in range(8)], dtype=np.int64)
+
+
+def from_states(game_states: [game_logic.GameState]) -> (np.ndarray, np.ndarray):
+    """
+    Piece codes and turns of many GameStates, for evaluate()
+    :param game_states: [GameState]
+    :return: ((N, 64) uint8 piece codes by row * 8 + col, (N,) int8 turns)
+    """
+    mailboxes = np.frombuffer(b''.join(bytes(state.mailbox) for state in game_states), dtype=np.uint8)
+    codes = mailboxes.reshape(len(game_states), -1)[:, _MAILBOX_SQUARES]
+    turns = np.array([state.turn for state in game_states], dtype=np.int8)
+    return codes, turns
+
+
+def from_packed(data: 'bytes or [bytes]') -> (np.ndarray, np.ndarray):
+    """
+    Piece codes and turns of many positions packed by GameState.to_bytes(), without building any GameStates
+    :param data: the packed positions, one after the other or in a list
+    :return: ((N, 64) uint8 piece codes by row * 8 + col, (N,) int8 turns)
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = b''.join(data)
+    if len(data) % game_logic.SERIALIZED_SIZE:
+        raise ValueError('Expected a multiple of {} bytes, got {}'.format(game_logic.SERIALIZED_SIZE, len(data)))
+    records = np.frombuffer(data, dtype=np.uint8).reshape(-1, game_logic.SERIALIZED_SIZE)
+    if (records[:, 0] != game_logic._SERIAL_VERSION).any():
+        raise ValueError('Unknown GameState format version')
+    codes = _SERIAL_CODES[records[:, game_logic.SERIALIZED_SIZE - 64:]]
+    turns = np.where(records[:, 1], game_logic.BLACK, game_logic.WHITE).astype(np.int8)
+    return codes, turns
+
+
+def from_planes(planes: np.ndarray) -> np.ndarray:
+    """
+    Piece codes of (N, 12, 64) piece planes (see PLANE_TYPES)
+    :param planes: array whose non-zero entries mark a piece of that plane on that square
+    :return: (N, 64) uint8 piece codes by row * 8 + col
+    """
+    return ((planes != 0) * _PLANE_CODES[None, :, None]).sum(axis=1).astype(np.uint8)
+
+
+def _neighbourhood(files: np.ndarray, fill: int, combine) -> np.ndarray:
+    """
+    Combine every file's value with those of the files on either side of it
+    :param files: (N, 8) array
+    :param fill: value beyond the edge of the board
+    :param combine: NumPy function of two arrays, e.g. np.minimum
+    :return: (N, 8) array
+    """
+    padded = np.pad(files, ((0, 0), (1, 1)), constant_values=fill)
+    return combine(combine(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+
+
+def _pawn_structure(board: np.ndarray) -> np.ndarray:
+    """
+    Vectorized ai._pawn_structure() plus the King shields ai._simple_eval() takes from it
+    :param board: (N, 8, 8) piece codes
+    :return: (N,) int64 scores from White's point of view
+    """
+    white, black = board == _WHITE_PAWN, board == _BLACK_PAWN
+    white_files, black_files = white.sum(axis=1), black.sum(axis=1)
+    rows = np.arange(8)[None, :, None]
+
+    points = ai.DOUBLED_PAWN_PENALTY * (np.maximum(black_files - 1, 0) - np.maximum(white_files - 1, 0)).sum(axis=1)
+    for files, color in ((white_files, 1), (black_files, -1)):
+        isolated = _neighbourhood(files, 0, np.add) == files
+        points -= color * ai.ISOLATED_PAWN_PENALTY * (files * isolated).sum(axis=1)
+
+    # A White Pawn is passed if no Black Pawn on its or a neighbouring file has a lower row, and vice versa
+    black_front = _neighbourhood(np.where(black, rows, 8).min(axis=1), 8, np.minimum)
+    white_front = _neighbourhood(np.where(white, rows, -1).max(axis=1), -1, np.maximum)
+    points += ((white & (black_front[:, None, :] >= rows)) * _WHITE_PASSED[rows]).sum(axis=(1, 2))
+    points -= ((black & (white_front[:, None, :] <= rows)) * _BLACK_PASSED[rows]).sum(axis=(1, 2))
+
+    near, far = ai.PAWN_SHIELD_BONUS
+    for pawns, king, back_rank, color in ((white, _WHITE_KING, 7, 1), (black, _BLACK_KING, 0, -1)):
+        shields = _neighbourhood(near * pawns[:, back_rank - color, :] + far * pawns[:, back_rank - 2 * color, :],
+                                 0, np.add)
+        points += color * (shields * (board[:, back_rank, :] == king)).sum(axis=1)
+    return points
+
+
+def evaluate(codes: np.ndarray, turns: np.ndarray, weights: ai.Weights = ai.DEFAULT_WEIGHTS) -> np.ndarray:
+    """
+    ai._simple_eval() of N positions at once: material, piece-square tables and pawn structure
+    :param codes: (N, 64) piece codes by row * 8 + col (see from_states() and from_packed()),
+                  or (N, 12, 64) piece planes (see from_planes())
+    :param turns: (N,) side to move of each position, game_logic.WHITE or game_logic.BLACK
+    :param weights: ai.Weights to evaluate with, e.g. an AI's weights
+    :return: (N,) int64 centipawns from the point of view of the side to move
+    """
+    codes = np.asarray(codes)
+    if codes.ndim == 3:
+        codes = from_planes(codes)
+    points = _build_square_values(weights)[codes, np.arange(64)].sum(axis=1)
+    points += _pawn_structure(codes.reshape(-1, 8, 8))
+    return points * np.asarray(turns, dtype=np.int64)
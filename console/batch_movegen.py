@@ -0,0 +1,402 @@
+# Kian Farsany
+# Chess
+# NumPy move generation for many boards at once, following the same rules as GameState
+
+import numpy as np
+import batch_eval
+import game_logic
+
+_PAWN, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING = (piece_type.code for piece_type in batch_eval.PLANE_TYPES)
+_COLOR_BITS = game_logic.WHITE_BIT | game_logic.BLACK_BIT
+_OFF_BOARD = 64  # Extra square that ends every ray, and is always occupied
+# A GameState.to_bytes() record, field by field
+_RECORD = np.dtype([('version', 'u1'), ('black_to_move', 'u1'), ('white_queens', 'u1'), ('black_queens', 'u1'),
+                    ('status', 'u1'), ('halfmove_clock', '<u2'), ('fullmove_number', '<u2'), ('flags', '<u8'),
+                    ('squares', 'u1', 64)])
+# The first four directions are diagonal, the last four orthogonal
+_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (1, 0), (0, -1), (0, 1))
+_DIAGONAL = np.array([True] * 4 + [False] * 4)
+
+
+def _build_tables() -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """
+    Precomputed move tables, by square row * 8 + col
+    :return: (rays: (64, 8, 7) squares along each direction, padded with _OFF_BOARD,
+              knight targets: (64, 64) bool, king targets: (64, 64) bool,
+              pawn attackers: (2, 64, 64) bool, [White 0 / Black 1, square, squares a Pawn attacks it from])
+    """
+    rays = np.full((64, 8, 7), _OFF_BOARD)
+    knights = np.zeros((64, 64), dtype=bool)
+    kings = np.zeros((64, 64), dtype=bool)
+    pawn_attackers = np.zeros((2, 64, 64), dtype=bool)
+    for square in range(64):
+        row, col = divmod(square, 8)
+        for direction, (row_step, col_step) in enumerate(_DIRECTIONS):
+            for distance in range(1, 8):
+                target_row, target_col = row + row_step * distance, col + col_step * distance
+                if not (0 <= target_row < 8 and 0 <= target_col < 8):
+                    break
+                rays[square, direction, distance - 1] = target_row * 8 + target_col
+            if 0 <= row + row_step < 8 and 0 <= col + col_step < 8:
+                kings[square, (row + row_step) * 8 + col + col_step] = True
+        for row_step, col_step in ((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2)):
+            if 0 <= row + row_step < 8 and 0 <= col + col_step < 8:
+                knights[square, (row + row_step) * 8 + col + col_step] = True
+        for color_index, pawn_row in ((0, row + 1), (1, row - 1)):  # White Pawns attack upwards, from below
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_row < 8 and 0 <= pawn_col < 8:
+                    pawn_attackers[color_index, square, pawn_row * 8 + pawn_col] = True
+    return rays, knights, kings, pawn_attackers
+
+
+_RAYS, _KNIGHT_TARGETS, _KING_TARGETS, _PAWN_ATTACKERS = _build_tables()
+_FROM = np.broadcast_to(np.arange(64)[:, None, None], _RAYS.shape)
+
+
+class BoardBatch:
+    """
+    N boards held as NumPy arrays, which generate moves and make moves all together
+    Squares are numbered row * 8 + col and hold game_logic piece codes (see GameState.mailbox);
+    moves are (N, 64, 64) masks indexed by [board, from square, to square]
+    """
+    def __init__(self, records: np.ndarray):
+        self.squares = batch_eval._SERIAL_CODES[records['squares']]  # (N, 64) piece codes
+        self.numbers = records['squares'] >> 4  # (N, 64) Piece name numbers, so GameStates can be rebuilt exactly
+        # (N, 64) en passant flags of Pawns and can_castle flags of Rooks and Kings
+        self.flags = (records['flags'][:, None] >> np.arange(64, dtype=np.uint64) & 1).astype(bool)
+        self.turn = np.where(records['black_to_move'], game_logic.BLACK, game_logic.WHITE).astype(np.int8)
+        self.white_queens = records['white_queens'].astype(np.int64)
+        self.black_queens = records['black_queens'].astype(np.int64)
+        self.halfmove_clock = records['halfmove_clock'].astype(np.int64)
+        self.fullmove_number = records['fullmove_number'].astype(np.int64)
+
+    def __len__(self):
+        return len(self.squares)
+
+    @classmethod
+    def from_packed(cls, data: 'bytes or [bytes]') -> 'BoardBatch':
+        """
+        Boards packed by GameState.to_bytes(), one after the other or in a list
+        :param data: bytes or [bytes]
+        :return: BoardBatch
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b''.join(data)
+        if len(data) % _RECORD.itemsize:
+            raise ValueError('Expected a multiple of {} bytes, got {}'.format(_RECORD.itemsize, len(data)))
+        records = np.frombuffer(data, dtype=_RECORD)
+        if (records['version'] != game_logic._SERIAL_VERSION).any():
+            raise ValueError('Unknown GameState format version')
+        return cls(records)
+
+    @classmethod
+    def from_states(cls, game_states: [game_logic.GameState]) -> 'BoardBatch':
+        """
+        Boards of many GameStates
+        :param game_states: [GameState]
+        :return: BoardBatch
+        """
+        return cls.from_packed([state.to_bytes() for state in game_states])
+
+    def to_packed(self) -> bytes:
+        """
+        Pack every board the way GameState.to_bytes() does; check variables are left to be worked out again
+        :return: bytes of len(self) records
+        """
+        records = np.zeros(len(self), dtype=_RECORD)
+        records['version'] = game_logic._SERIAL_VERSION
+        records['black_to_move'] = self.turn == game_logic.BLACK
+        records['white_queens'] = self.white_queens
+        records['black_queens'] = self.black_queens
+        records['status'] = game_logic._STATUS_UNKNOWN
+        records['halfmove_clock'] = self.halfmove_clock
+        records['fullmove_number'] = self.fullmove_number
+        records['flags'] = (self.flags.astype(np.uint64) << np.arange(64, dtype=np.uint64)).sum(axis=1)
+        records['squares'] = np.where(self.squares != 0, (self.squares & 7) | (self.squares & game_logic.BLACK_BIT) >> 1
+                                      | self.numbers << 4, 0)
+        return records.tobytes()
+
+    def to_states(self) -> [game_logic.GameState]:
+        """
+        A GameState for every board, e.g. to check results against
+        :return: [GameState]
+        """
+        data = self.to_packed()
+        size = game_logic.SERIALIZED_SIZE
+        return [game_logic.GameState.from_bytes(data[start:start + size]) for start in range(0, len(data), size)]
+
+    def _own_bits(self) -> np.ndarray:
+        """(N, 1) color bit of the side to move"""
+        return np.where(self.turn == game_logic.WHITE, game_logic.WHITE_BIT, game_logic.BLACK_BIT)[:, None]
+
+    def pseudo_legal_moves(self) -> np.ndarray:
+        """
+        Moves of the side to move that follow the Pieces' rules, without looking at whether they leave the King
+        under attack; the same moves GameState works out before its lookahead
+        :return: (N, 64, 64) bool
+        """
+        squares = self.squares
+        own_bits = self._own_bits()
+        enemy_bits = _COLOR_BITS ^ own_bits
+        own = (squares & own_bits) != 0
+        types = np.where(own, squares & 7, 0)
+        padded = np.concatenate([squares, np.full((len(self), 1), game_logic.OFFBOARD, dtype=squares.dtype)], axis=1)
+
+        # Sliders: a square on a ray is reached if every square before it is empty and it doesn't hold an own Piece
+        along = padded[:, _RAYS]  # (N, 64, 8, 7)
+        blocked = np.logical_or.accumulate(along != 0, axis=3)
+        reached = np.ones(along.shape, dtype=bool)
+        reached[..., 1:] = ~blocked[..., :-1]
+        reached &= (_RAYS != _OFF_BOARD) & ((along & own_bits[:, :, None, None]) == 0)
+        diagonal = (types == _BISHOP) | (types == _QUEEN)
+        orthogonal = (types == _ROOK) | (types == _QUEEN)
+        reached &= (diagonal[:, :, None] & _DIAGONAL | orthogonal[:, :, None] & ~_DIAGONAL)[..., None]
+        moves = np.zeros((len(self), 64, 65), dtype=bool)
+        moves[:, _FROM, _RAYS] = reached
+        moves = moves[:, :, :64]
+
+        moves |= (types == _KNIGHT)[:, :, None] & _KNIGHT_TARGETS & ~own[:, None, :]
+        moves |= (types == _KING)[:, :, None] & _KING_TARGETS & ~own[:, None, :]
+        self._add_pawn_moves(moves, types, enemy_bits)
+        self._add_castles(moves, types)
+        return moves
+
+    def _add_pawn_moves(self, moves: np.ndarray, types: np.ndarray, enemy_bits: np.ndarray) -> None:
+        """
+        Pushes, jumps, captures and en passants of the side to move's Pawns, as in Pawn.calculate_possible_moves()
+        :param moves: (N, 64, 64) mask to add to
+        :param types: (N, 64) piece types of the side to move
+        :param enemy_bits: (N, 1) color bit of the other side
+        :return: None
+        """
+        squares = self.squares
+        empty = squares == 0
+        white = (self.turn == game_logic.WHITE)[:, None]
+        forward = np.where(white, -8, 8)
+        rows, cols = np.arange(64) // 8, np.arange(64) % 8
+        pawns = (types == _PAWN) & (rows > 0) & (rows < 7)  # A Pawn on an end row has no moves
+        start_row = np.where(white, 6, 1)
+        boards, origins = np.nonzero(pawns)
+        ahead = origins + forward[boards, 0]
+        push = empty[boards, ahead]
+        moves[boards[push], origins[push], ahead[push]] = True
+        jump = push & (rows[origins] == start_row[boards, 0]) & empty[boards, np.clip(ahead + forward[boards, 0],
+                                                                                        0, 63)]
+        moves[boards[jump], origins[jump], ahead[jump] + forward[boards[jump], 0]] = True
+        enemy_pawn = _PAWN | enemy_bits[:, 0]
+        for side in (1, -1):
+            beside = cols[origins] + side
+            on_board = (beside >= 0) & (beside < 8)
+            board, origin, target = boards[on_board], origins[on_board], ahead[on_board] + side
+            capture = (squares[board, target] & enemy_bits[board, 0]) != 0
+            en_passant = empty[board, target] & (squares[board, origin + side] == enemy_pawn[board]) & \
+                self.flags[board, origin + side]
+            take = capture | en_passant
+            moves[board[take], origin[take], target[take]] = True
+
+    def _add_castles(self, moves: np.ndarray, types: np.ndarray) -> None:
+        """
+        King jumps of castles, as in King._explore_castles(); like there, whether the squares are attacked
+        is left to the lookahead (see legal_moves())
+        :param moves: (N, 64, 64) mask to add to
+        :param types: (N, 64) piece types of the side to move
+        :return: None
+        """
+        boards, kings = np.nonzero((types == _KING) & self.flags)
+        row_start = kings - kings % 8
+        for rook_col, target_col, between in ((7, 6, (5, 6)), (0, 2, (1, 2, 3))):
+            rook = row_start + rook_col
+            allowed = ((self.squares[boards, rook] & 7) == _ROOK) & self.flags[boards, rook]
+            for col in between:
+                allowed &= self.squares[boards, row_start + col] == 0
+            moves[boards[allowed], kings[allowed], row_start[allowed] + target_col] = True
+
+    def legal_moves(self) -> np.ndarray:
+        """
+        Pseudo-legal moves that don't leave the mover's King under attack, nor castle out of, through or into check;
+        the moves GameState.legal_moves() gives
+        :return: (N, 64, 64) bool
+        """
+        moves = self.pseudo_legal_moves()
+        boards, origins, targets = np.nonzero(moves)
+        own_bits = self._own_bits()[:, 0]
+        by_bits = _COLOR_BITS ^ own_bits
+        king_code = _KING | own_bits
+        has_king = (self.squares == king_code[:, None]).any(axis=1)
+        king_squares = (self.squares == king_code[:, None]).argmax(axis=1)
+
+        castle = ((self.squares[boards, origins] & 7) == _KING) & (np.abs(targets % 8 - origins % 8) == 2)
+        trial = self.squares[boards].copy()
+        index = np.arange(len(boards))
+        moving = trial[index, origins]
+        en_passant = ((moving & 7) == _PAWN) & (origins % 8 != targets % 8) & (trial[index, targets] == 0)
+        trial[index[en_passant], origins[en_passant] - origins[en_passant] % 8 + targets[en_passant] % 8] = 0
+        trial[index, origins] = 0
+        trial[index, targets] = moving
+        king = np.where(origins == king_squares[boards], targets, king_squares[boards])
+        safe = ~_attacked(trial, king, by_bits[boards])
+
+        # Castles may not start in, pass through, or end in check, tested on the board before the King moves
+        if castle.any():
+            castles = index[castle]
+            step = np.where(targets[castles] > origins[castles], 1, -1)
+            safe[castles] = True
+            for distance in range(3):
+                square = origins[castles] + step * distance
+                safe[castles] &= ~_attacked(self.squares[boards[castles]], square, by_bits[boards[castles]])
+        safe |= ~has_king[boards]
+        moves[boards[~safe], origins[~safe], targets[~safe]] = False
+        return moves
+
+    def apply(self, moves: np.ndarray) -> None:
+        """
+        Make one move on every board at once, as GameState.execute_move() would
+        :param moves: (N,) packed moves (only the from and to bits are read), or -1 to leave that board as it is
+        :return: None
+        """
+        moves = np.asarray(moves, dtype=np.int64)
+        boards = np.nonzero(moves >= 0)[0]
+        origins, targets = moves[boards] & 63, moves[boards] >> 6 & 63
+        piece = self.squares[boards, origins]
+        number = self.numbers[boards, origins]
+        kind = piece & 7
+        pawn = kind == _PAWN
+        black = (piece & game_logic.BLACK_BIT) != 0
+        captured = self.squares[boards, targets] != 0
+
+        en_passant = pawn & (origins % 8 != targets % 8) & ~captured
+        passed = boards[en_passant], origins[en_passant] - origins[en_passant] % 8 + targets[en_passant] % 8
+        self._clear(*passed)
+        captured |= en_passant
+
+        self._clear(boards, origins)
+        self.squares[boards, targets] = piece
+        self.numbers[boards, targets] = number
+        self.flags[boards, targets] = pawn & (np.abs(targets // 8 - origins // 8) == 2)  # Only jumps keep a flag
+
+        promote = pawn & ((targets // 8 == 0) | (targets // 8 == 7))
+        self.white_queens[boards[promote & ~black]] += 1
+        self.black_queens[boards[promote & black]] += 1
+        queens = np.where(black, self.black_queens[boards], self.white_queens[boards])
+        self.squares[boards[promote], targets[promote]] = _QUEEN | (piece[promote] & _COLOR_BITS)
+        self.numbers[boards[promote], targets[promote]] = queens[promote]
+
+        castle = (kind == _KING) & (np.abs(targets % 8 - origins % 8) == 2)
+        row_start = targets[castle] - targets[castle] % 8
+        kingside = targets[castle] % 8 == 6
+        rook_from = row_start + np.where(kingside, 7, 0)
+        rook_to = row_start + np.where(kingside, 5, 3)
+        castled = boards[castle]
+        self.squares[castled, rook_to] = self.squares[castled, rook_from]
+        self.numbers[castled, rook_to] = self.numbers[castled, rook_from]
+        self.flags[castled, rook_to] = self.flags[castled, rook_from]  # Like _complete_castle(), the flag stays
+        self._clear(castled, rook_from)
+
+        self.halfmove_clock[boards] = np.where(pawn | captured, 0, self.halfmove_clock[boards] + 1)
+        self.fullmove_number[boards] += black
+        self.turn[boards] = -self.turn[boards]
+
+    def pack_moves(self, boards: np.ndarray, origins: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Vectorized game_logic.pack_move(): packed moves with their flags, which GameState.execute_move() needs
+        :param boards: (M,) board of each move
+        :param origins: (M,) from squares
+        :param targets: (M,) to squares
+        :return: (M,) packed moves
+        """
+        piece = self.squares[boards, origins] & 7
+        capture = self.squares[boards, targets] != 0
+        pawn = piece == _PAWN
+        en_passant = pawn & (origins % 8 != targets % 8) & ~capture
+        flags = np.where(capture, game_logic.MOVE_CAPTURE, np.where(en_passant, game_logic.MOVE_EN_PASSANT,
+                                                                      game_logic.MOVE_QUIET))
+        promote = pawn & ((targets // 8 == 0) | (targets // 8 == 7))
+        flags = np.where(promote, flags | game_logic.MOVE_PROMOTION | game_logic.PROMOTE_TO_QUEEN, flags)
+        flags = np.where(pawn & (np.abs(targets // 8 - origins // 8) == 2), game_logic.MOVE_DOUBLE_PAWN_PUSH, flags)
+        castle = (piece == _KING) & (np.abs(targets % 8 - origins % 8) == 2)
+        flags = np.where(castle, np.where(targets % 8 == 6, game_logic.MOVE_KING_CASTLE, game_logic.MOVE_QUEEN_CASTLE),
+                         flags)
+        return origins | targets << 6 | flags << 12
+
+    def _clear(self, boards: np.ndarray, squares: np.ndarray) -> None:
+        """Empty the given squares"""
+        self.squares[boards, squares] = 0
+        self.numbers[boards, squares] = 0
+        self.flags[boards, squares] = False
+
+    def children(self, moves: np.ndarray) -> ('BoardBatch', np.ndarray):
+        """
+        Every board after every one of its moves, e.g. to expand a perft level
+        :param moves: (N, 64, 64) mask from legal_moves()
+        :return: (BoardBatch of the children, (M,) index of each child's parent)
+        """
+        parents, origins, targets = np.nonzero(moves)
+        child = object.__new__(BoardBatch)
+        for name in ('squares', 'numbers', 'flags', 'turn', 'white_queens', 'black_queens', 'halfmove_clock',
+                     'fullmove_number'):
+            setattr(child, name, getattr(self, name)[parents].copy())
+        child.apply(self.pack_moves(parents, origins, targets))
+        return child, parents
+
+
+def _attacked(squares: np.ndarray, targets: np.ndarray, by_bits: np.ndarray) -> np.ndarray:
+    """
+    Vectorized game_logic._is_square_attacked()
+    :param squares: (M, 64) piece codes
+    :param targets: (M,) square on each board
+    :param by_bits: (M,) color bit of the attackers
+    :return: (M,) bool
+    """
+    attacked = ((squares == (_KNIGHT | by_bits)[:, None]) & _KNIGHT_TARGETS[targets]).any(axis=1)
+    attacked |= ((squares == (_KING | by_bits)[:, None]) & _KING_TARGETS[targets]).any(axis=1)
+    pawn_color = (by_bits == game_logic.BLACK_BIT).astype(int)
+    attacked |= ((squares == (_PAWN | by_bits)[:, None]) & _PAWN_ATTACKERS[pawn_color, targets]).any(axis=1)
+
+    padded = np.concatenate([squares, np.full((len(squares), 1), game_logic.OFFBOARD, dtype=squares.dtype)], axis=1)
+    along = np.take_along_axis(padded, _RAYS[targets].reshape(len(targets), -1), axis=1).reshape(-1, 8, 7)
+    first = np.take_along_axis(along, (along != 0).argmax(axis=2)[:, :, None], axis=2)[:, :, 0]
+    queen = first == (_QUEEN | by_bits)[:, None]
+    slider = np.where(_DIAGONAL, (_BISHOP | by_bits)[:, None], (_ROOK | by_bits)[:, None])
+    attacked |= ((first == slider) | queen).any(axis=1)
+    return attacked
+
+
+def state_moves(game_state: game_logic.GameState) -> np.ndarray:
+    """
+    Mask of the moves a GameState allows the side to move, to check a BoardBatch against
+    :param game_state: GameState
+    :return: (64, 64) bool
+    """
+    moves = np.zeros((64, 64), dtype=bool)
+    for move in game_state.legal_moves():
+        moves[move & 63, move >> 6 & 63] = True
+    return moves
+
+
+def random_moves(batch: BoardBatch, moves: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Pick one move at random on every board, for playouts
+    :param batch: BoardBatch the moves are for
+    :param moves: (N, 64, 64) mask from legal_moves()
+    :param rng: NumPy random Generator
+    :return: (N,) packed moves for BoardBatch.apply() or GameState.execute_move(), -1 for boards without moves
+    """
+    flat = moves.reshape(len(moves), -1)
+    counts = flat.sum(axis=1)
+    picks = (rng.random(len(moves)) * counts).astype(np.int64)
+    chosen = (np.cumsum(flat, axis=1) > picks[:, None]).argmax(axis=1)
+    packed = batch.pack_moves(np.arange(len(moves)), chosen // 64, chosen % 64)
+    return np.where(counts > 0, packed, -1)
+
+
+def perft(game_state: game_logic.GameState, depth: int) -> int:
+    """
+    Count the leaf nodes of the legal move tree, one level at a time (see game_logic.perft())
+    :param game_state: GameState
+    :param depth: plies
+    :return: int
+    """
+    batch = BoardBatch.from_states([game_state])
+    for _ in range(depth - 1):
+        batch, _ = batch.children(batch.legal_moves())
+    return int(batch.legal_moves().sum()) if depth > 0 else 1
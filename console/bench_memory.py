@@ -0,0 +1,95 @@
+# Kian Farsany
+# Chess
+# Memory benchmark of the game logic and AI with tracemalloc: bytes retained per object and peak use per operation
+
+import argparse
+import gc
+import tracemalloc
+import ai
+import bench_suite
+import game_logic
+
+PLIES = 24  # Positions are taken this many moves into each of bench_suite's fixed game scripts
+
+
+def _new_piece(piece_type: type) -> game_logic.Piece:
+    """A White Piece of the given type with no moves worked out"""
+    if piece_type is game_logic.Pawn:
+        return game_logic.Pawn(0, game_logic.WHITE)
+    if piece_type is game_logic.King:
+        return game_logic.King(game_logic.WHITE)
+    return piece_type(0, 0, game_logic.WHITE, piece_type.__name__)
+
+
+def _retained(build, count: int) -> float:
+    """
+    Bytes still allocated per object once build() returns, while its result is kept alive
+    :param build: function without arguments returning a list of count objects
+    :param count: how many objects build() makes
+    :return: float
+    """
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    del kept
+    return (after - before) / count
+
+
+def _peak(function) -> int:
+    """
+    Highest allocation, in bytes above what was allocated before, while function runs
+    :param function: function without arguments
+    :return: int
+    """
+    gc.collect()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    function()
+    return tracemalloc.get_traced_memory()[1] - before
+
+
+def run(count: int = 200, search_depth: int = 2) -> {str: float}:
+    """
+    Measure memory with tracemalloc
+    :param count: how many positions the per-object figures average over
+    :param search_depth: full-width plies of the search measurement
+    :return: {measurement: bytes}
+    """
+    scripts = bench_suite._game_scripts(count, PLIES)
+    positions = bench_suite._middlegames(scripts, PLIES)
+    pieces = [piece for position in positions for piece in position.pieces]
+    piece_types = [type(piece) for piece in pieces]
+    search_position = positions[0].snapshot()
+    search = ai.Search()
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    try:
+        results = {
+            'game_state': _retained(lambda: bench_suite._middlegames(scripts, PLIES), count),
+            'snapshot': _retained(lambda: [position.snapshot() for position in positions], count),
+            'child': _retained(lambda: [position.child(position.legal_moves()[0]) for position in positions], count),
+            'piece': _retained(lambda: [_new_piece(piece_type) for piece_type in piece_types], len(pieces)),
+            'move_view': _retained(lambda: [position._build_move_view() for position in positions], count),
+            'move_list': _retained(lambda: [position.legal_moves()[:] for position in positions], count),
+            'execute_move_peak': _peak(lambda: positions[1].snapshot().execute_move(positions[1].legal_moves()[0])),
+            'search_peak': _peak(lambda: search.best_move(search_position, search_depth)),
+        }
+    finally:
+        if not started:
+            tracemalloc.stop()
+    results['search_nodes'] = search.nodes + search.qnodes
+    results['search_bytes_per_node'] = results['search_peak'] / max(results['search_nodes'], 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory use of the game logic and AI")
+    parser.add_argument('--positions', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=2)
+    arguments = parser.parse_args()
+
+    for measurement, value in run(arguments.positions, arguments.depth).items():
+        print("{:<22} {:>12.0f}{}".format(measurement, value, "" if measurement == 'search_nodes' else " bytes"))
@@ -0,0 +1,72 @@
+# Kian Farsany
+# Chess
+# Micro-benchmark of GameState.to_bytes()/from_bytes() against pickle
+
+import pickle
+import random
+import time
+import game_logic
+
+
+def _sample_positions(count: int, seed: int = 0) -> [game_logic.GameState]:
+    """
+    Play random games to collect a spread of opening, middlegame and endgame positions
+    :param count: how many positions to collect
+    :param seed: random seed so every run benchmarks the same positions
+    :return: [GameState]
+    """
+    rng = random.Random(seed)
+    positions = []
+    game_state = game_logic.GameState()
+    while len(positions) < count:
+        moves = game_state.legal_moves()
+        if not moves or game_state.mate or game_state.is_draw():
+            game_state = game_logic.GameState()
+            continue
+        game_state.execute_move(rng.choice(moves))
+        positions.append(game_state.snapshot())
+    return positions
+
+
+def _time_per_position(function, positions: list, repeats: int) -> float:
+    """
+    Best average time in microseconds of calling function on every position
+    :param function: function to time
+    :param positions: its arguments
+    :param repeats: how many times to repeat the measurement
+    :return: float
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for position in positions:
+            function(position)
+        best = min(best, time.perf_counter() - start)
+    return best / len(positions) * 1e6
+
+
+def run(count: int = 500, repeats: int = 5) -> dict:
+    """
+    Compare size, encode and decode time of the packed format and pickle
+    :param count: how many positions to use
+    :param repeats: how many times to repeat each measurement
+    :return: {format: {'bytes': average size, 'encode_us': ..., 'decode_us': ...}}
+    """
+    positions = _sample_positions(count)
+    packed = [position.to_bytes() for position in positions]
+    pickled = [pickle.dumps(position, pickle.HIGHEST_PROTOCOL) for position in positions]
+    return {
+        'to_bytes': {'bytes': sum(map(len, packed)) / count,
+                     'encode_us': _time_per_position(game_logic.GameState.to_bytes, positions, repeats),
+                     'decode_us': _time_per_position(game_logic.GameState.from_bytes, packed, repeats)},
+        'pickle': {'bytes': sum(map(len, pickled)) / count,
+                   'encode_us': _time_per_position(lambda p: pickle.dumps(p, pickle.HIGHEST_PROTOCOL),
+                                                   positions, repeats),
+                   'decode_us': _time_per_position(pickle.loads, pickled, repeats)},
+    }
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print("{:<9} {:>8.0f} bytes  encode {:>7.1f} us  decode {:>7.1f} us".format(
+            name, result['bytes'], result['encode_us'], result['decode_us']))
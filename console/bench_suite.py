@@ -0,0 +1,186 @@
+# Kian Farsany
+# Chess
+# Benchmark suite for the game logic and AI, with JSON baselines and a regression check
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import ai
+import game_logic
+
+
+def _game_scripts(count: int = 8, plies: int = 60, seed: int = 0) -> [[int]]:
+    """
+    Fixed game scripts: seeded random games as lists of packed moves, the same on every run
+    :param count: how many games
+    :param plies: moves per game, at most
+    :param seed: random seed
+    :return: [[packed move]]
+    """
+    rng = random.Random(seed)
+    scripts = []
+    for _ in range(count):
+        game_state = game_logic.GameState()
+        script = []
+        for _ in range(plies):
+            moves = game_state.legal_moves()
+            if not moves or game_state.mate or game_state.stalemate:
+                break
+            script.append(rng.choice(moves))
+            game_state.execute_move(script[-1])
+        scripts.append(script)
+    return scripts
+
+
+def _middlegames(scripts: [[int]], plies: int = 24) -> [game_logic.GameState]:
+    """
+    The position after the given number of plies of each script
+    :param scripts: from _game_scripts()
+    :param plies: how far into each game
+    :return: [GameState]
+    """
+    positions = []
+    for script in scripts:
+        game_state = game_logic.GameState()
+        for move in script[:plies]:
+            game_state.execute_move(move)
+        positions.append(game_state)
+    return positions
+
+
+def _best_time(function, repeats: int) -> float:
+    """
+    Fastest of several runs of function, in seconds
+    :param function: function without arguments
+    :param repeats: how many runs
+    :return: float
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _replay(scripts: [[int]]) -> None:
+    """Play every script from the start"""
+    for script in scripts:
+        game_state = game_logic.GameState()
+        for move in script:
+            game_state.execute_move(move)
+
+
+def _update_all(positions: [game_logic.GameState]) -> None:
+    """Work out the possible moves of every position again"""
+    for position in positions:
+        position._update_possible_moves()
+
+
+def _search_all(positions: [game_logic.GameState], depth: int) -> int:
+    """
+    Search every position to a fixed depth with a fresh transposition table
+    :param positions: [GameState]
+    :param depth: full-width plies
+    :return: nodes searched, quiescence nodes included
+    """
+    nodes = 0
+    for position in positions:
+        search = ai.Search()
+        search.best_move(position, depth)
+        nodes += search.nodes + search.qnodes
+    return nodes
+
+
+def run(repeats: int = 5, search_depth: int = 3) -> {str: dict}:
+    """
+    Time every benchmark
+    :param repeats: runs of each benchmark; the fastest counts
+    :param search_depth: full-width plies of the search benchmark
+    :return: {benchmark: {'us': microseconds per operation, 'operations': operations per run}}, and for the search
+    benchmark also 'nodes': nodes searched per run, which does not depend on the machine
+    """
+    scripts = _game_scripts()
+    positions = _middlegames(scripts)
+    moves = sum(map(len, scripts))
+    benchmarks = {
+        'construct': (lambda: [game_logic.GameState() for _ in range(20)], 20),
+        'execute_move': (lambda: _replay(scripts), moves),
+        'update_possible_moves': (lambda: _update_all(positions), len(positions)),
+        'simple_eval': (lambda: [ai._simple_eval(position) for position in positions * 50], len(positions) * 50),
+        'search': (lambda: _search_all(positions[:4], search_depth), 4),
+    }
+    results = dict()
+    for name, (function, operations) in benchmarks.items():
+        seconds = _best_time(function, repeats)
+        results[name] = {'us': seconds / operations * 1e6, 'operations': operations}
+    results['search']['nodes'] = _search_all(positions[:4], search_depth)
+    return results
+
+
+def save(results: {str: dict}, path: str) -> None:
+    """
+    Write results to a JSON baseline, with the interpreter they were measured on
+    :param results: from run()
+    :param path: baseline file
+    :return: None
+    """
+    with open(path, 'w') as baseline_file:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'benchmarks': results},
+                  baseline_file, indent=1)
+
+
+def compare(results: {str: dict}, path: str, threshold: float = 10.0) -> [str]:
+    """
+    Compare results against a JSON baseline
+    :param results: from run()
+    :param path: baseline file written by save()
+    :param threshold: percentage a benchmark may slow down by, or search more nodes by, before it counts as a
+    regression
+    :return: [name of each benchmark that regressed]
+    """
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)['benchmarks']
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = (result['us'] / baseline[name]['us'] - 1) * 100
+        print("{:<22} {:>12.1f} us  baseline {:>12.1f} us  {:>+7.1f}%{}".format(
+            name, result['us'], baseline[name]['us'], change, "  REGRESSION" if change > threshold else ""))
+        regressed = change > threshold
+        if 'nodes' in result and 'nodes' in baseline[name]:
+            # Node counts are the same on every run and machine, so they catch search changes timing noise hides
+            node_change = (result['nodes'] / baseline[name]['nodes'] - 1) * 100
+            print("{:<22} {:>12} nodes baseline {:>12} nodes {:>+7.1f}%{}".format(
+                '', result['nodes'], baseline[name]['nodes'], node_change,
+                "  REGRESSION" if node_change > threshold else ""))
+            regressed = regressed or node_change > threshold
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game logic and AI")
+    parser.add_argument('--save', metavar='BASELINE', help="write the results to a JSON baseline")
+    parser.add_argument('--compare', metavar='BASELINE', help="fail if any benchmark is slower than the baseline")
+    parser.add_argument('--threshold', type=float, default=10.0, help="allowed slowdown in percent (default 10)")
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args()
+
+    measured = run(arguments.repeats)
+    if arguments.compare:
+        failed = compare(measured, arguments.compare, arguments.threshold)
+        if failed:
+            print("Regressed beyond {}%: {}".format(arguments.threshold, ", ".join(failed)))
+            sys.exit(1)
+    else:
+        for benchmark, measurement in measured.items():
+            print("{:<22} {:>12.1f} us{}".format(benchmark, measurement['us'], "  {} nodes".format(
+                measurement['nodes']) if 'nodes' in measurement else ""))
+    if arguments.save:
+        save(measured, arguments.save)
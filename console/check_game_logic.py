@@ -0,0 +1,126 @@
+# Kian Farsany
+# Chess
+# Correctness checks of move generation, child() and serialization; exits with status 1 if any fails
+
+import argparse
+import copy
+import sys
+import bench_suite
+import game_logic
+
+PERFT_COUNTS = (20, 400, 8902, 197281)  # Leaf nodes from the start position at depths 1, 2, 3 and 4
+
+
+def _fingerprint(game_state: game_logic.GameState) -> tuple:
+    """
+    Everything that makes a position, checking on the way that the board, mailbox and Pieces agree
+    :param game_state: GameState
+    :return: tuple that is equal for equal positions
+    """
+    for row in range(8):
+        for col in range(8):
+            piece = game_state.board[row][col]
+            if game_state.mailbox[game_logic._to_mailbox(row, col)] != (piece.piece_code() if piece else 0):
+                raise AssertionError('mailbox and board disagree at {}'.format((row, col)))
+            if piece is not None and ((piece.row, piece.col) != (row, col) or piece not in game_state.pieces):
+                raise AssertionError('{} is out of place at {}'.format(piece, (row, col)))
+    if len(game_state.pieces) != sum(1 for row in game_state.board for piece in row if piece is not None):
+        raise AssertionError('pieces and board disagree')
+    return ([[piece.name if piece else '' for piece in row] for row in game_state.board],
+            game_state.turn, game_state.check, game_state.mate, game_state.stalemate,
+            sorted(game_state.legal_moves()), game_state.position_hash(), game_state.pawn_hash(),
+            game_state.halfmove_clock, game_state.fullmove_number,
+            sorted((piece.name, getattr(piece, 'en_passant', None), getattr(piece, 'can_castle', None))
+                   for piece in game_state.pieces))
+
+
+def _replayed(games: int, plies: int, seed: int):
+    """
+    Every position of bench_suite's seeded random game scripts, each with the move played from it
+    :param games: how many games
+    :param plies: moves per game, at most
+    :param seed: random seed
+    :return: generator of (GameState, packed move); the GameState is played on after each move
+    """
+    for script in bench_suite._game_scripts(games, plies, seed):
+        game_state = game_logic.GameState()
+        for move in script:
+            yield game_state, move
+            game_state.execute_move(move)
+
+
+def check_perft(depth: int = len(PERFT_COUNTS)) -> [str]:
+    """
+    Count the leaf nodes from the start position against the known perft results
+    :param depth: deepest depth to count, at most len(PERFT_COUNTS)
+    :return: [failure message]
+    """
+    failures = []
+    for current_depth, expected in enumerate(PERFT_COUNTS[:depth], 1):
+        nodes = game_logic.perft(game_logic.GameState(), current_depth)
+        if nodes != expected:
+            failures.append('perft({}) = {}, expected {}'.format(current_depth, nodes, expected))
+    return failures
+
+
+def check_child(games: int = 6, plies: int = 60, seed: int = 0) -> [str]:
+    """
+    Check that child() gives the same position as execute_move() on a deep copy, and leaves its parent untouched,
+    for every move of every position of some random games
+    :param games: how many games
+    :param plies: moves per game, at most
+    :param seed: random seed
+    :return: [failure message]
+    """
+    failures = []
+    for game_state, _ in _replayed(games, plies, seed):
+        before = _fingerprint(game_state)
+        for move in game_state.legal_moves():
+            reference = copy.deepcopy(game_state)
+            reference.execute_move(move)
+            if _fingerprint(game_state.child(move)) != _fingerprint(reference):
+                failures.append('child({}) differs from execute_move() at move {}'.format(
+                    move, game_state.fullmove_number))
+        if _fingerprint(game_state) != before:
+            failures.append('child() changed its parent at move {}'.format(game_state.fullmove_number))
+    return failures
+
+
+def check_serialization(games: int = 20, plies: int = 150, seed: int = 1) -> [str]:
+    """
+    Check that from_bytes(to_bytes()) gives back the same position, and to_bytes() the same bytes,
+    for every position of some random games
+    :param games: how many games
+    :param plies: moves per game, at most
+    :param seed: random seed
+    :return: [failure message]
+    """
+    failures = []
+    for game_state, move in _replayed(games, plies, seed):
+        for position in (game_state, game_state.child(move)):
+            data = position.to_bytes()
+            restored = game_logic.GameState.from_bytes(data)
+            if len(data) != game_logic.SERIALIZED_SIZE or restored.to_bytes() != data or \
+                    _fingerprint(restored) != _fingerprint(position):
+                failures.append('from_bytes(to_bytes()) differs at move {}'.format(position.fullmove_number))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check move generation, child() and serialization")
+    parser.add_argument('--perft-depth', type=int, default=len(PERFT_COUNTS))
+    parser.add_argument('--games', type=int, default=None,
+                        help="random games for the child and serialization checks (6 and 20 by default)")
+    arguments = parser.parse_args()
+
+    all_failures = []
+    for name, check in (('perft', lambda: check_perft(arguments.perft_depth)),
+                        ('child', lambda: check_child(arguments.games or 6)),
+                        ('serialization', lambda: check_serialization(arguments.games or 20))):
+        failed = check()
+        print("{:<14} {}".format(name, "FAILED" if failed else "ok"))
+        all_failures += failed
+    for failure in all_failures[:20]:
+        print(failure)
+    if all_failures:
+        sys.exit(1)
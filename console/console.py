@@ -2,8 +2,10 @@
 # Chess
 # Console/Main
 
+import argparse
 import random
 import game_logic
+import profiler
 from ai import AI
 
 
@@ -20,6 +22,8 @@ def _run() -> None:
             _run_with_two_ais()
         else:
             _run_with_one_ai(ai_color)
+    if game_logic.is_instrumented():
+        print(game_logic.instrumentation_report())
 
 
 def _run_with_one_ai(ai_color: int) -> None:
@@ -39,6 +43,7 @@ def _run_with_one_ai(ai_color: int) -> None:
 
         if game_state.turn is ai_color:
             move = ai.make_move(game_state)
+            _print_principal_variation(game_state, ai.principal_variation)
         else:
             try:
                 move = _retrieve_move_input(game_state)
@@ -74,8 +79,10 @@ def _run_with_two_ais() -> None:
 
         if game_state.turn is game_logic.WHITE:
             move = ai_white.make_move(game_state)
+            _print_principal_variation(game_state, ai_white.principal_variation)
         else:
             move = ai_black.make_move(game_state)
+            _print_principal_variation(game_state, ai_black.principal_variation)
 
         game_state.execute_move(move)
         print()
@@ -194,9 +201,9 @@ def _print_board(state: game_logic.GameState) -> None:
 
 def _is_endgame(state: game_logic.GameState) -> bool:
     """
-    Prints check, checkmate, and stalemate info to the console if applicable
+    Prints check, checkmate, stalemate and draw info to the console if applicable
     :param state: GameState
-    :return: True if game is over (checkmate or stalemate). False if not
+    :return: True if game is over (checkmate, stalemate or draw). False if not
     """
     if state.mate:
         if state.check is game_logic.WHITE:
@@ -204,6 +211,12 @@ def _is_endgame(state: game_logic.GameState) -> bool:
         else:
             print("WHITE is the victor")
         return True
+    elif state.is_threefold_repetition():
+        print("Draw by threefold repetition...")
+        return True
+    elif state.is_fifty_move_rule():
+        print("Fifty moves without a capture or a pawn move. It's a draw!")
+        return True
     elif state.check != 0:
         checks = ["CZECH", "CHUBBY CHECKER", "CHECK PLEASE"]
         print(checks[random.randint(0, 2)])
@@ -215,6 +228,23 @@ def _is_endgame(state: game_logic.GameState) -> bool:
         return False
 
 
+def _print_principal_variation(state: game_logic.GameState, line: [int]) -> None:
+    """
+    Prints the line of play the AI expects, e.g. "Expected line: WP5 e4, BP4 d5"
+    :param state: GameState the line starts from
+    :param line: packed moves
+    :return: None
+    """
+    if not line:
+        return
+    text = []
+    for move in line:
+        piece, row, col = game_logic.decode_move(state, move)
+        text.append(piece.name + ' ' + _convert_move_format((row, col)))
+        state = state.child(move)
+    print("Expected line: " + ", ".join(text))
+
+
 def _print_turn(state: game_logic.GameState) -> None:
     """Print whose turn it is"""
     print("Turn: ", end='')
@@ -238,7 +268,7 @@ def _retrieve_move_input(state: game_logic.GameState) -> (game_logic.Piece, int,
         user_input = 'B' + user_input.upper()
     for p in state.pieces:
         if user_input == p.name:
-            moves = list(p.possible_moves.keys())
+            moves = list(state.all_possible_moves[p].keys())
             piece = p
             break
     else:
@@ -296,4 +326,18 @@ def _user_select_move(piece: game_logic.Piece, moves: [(int, int)]) -> (game_log
 
 
 if __name__ == "__main__":
-    _run()
+    parser = argparse.ArgumentParser(description="Play chess in the console")
+    parser.add_argument('--stats', action='store_true',
+                        help="print where the game logic spent its time once the game is over")
+    parser.add_argument('--profile', metavar='PATH', help="sample the AI's searches and write collapsed stacks to PATH")
+    arguments = parser.parse_args()
+
+    if arguments.stats:
+        game_logic.enable_instrumentation()
+    if arguments.profile:
+        profiler.enable_profiling()
+    try:
+        _run()
+    finally:  # Keep the samples even if the game is cut short
+        if profiler.is_profiling():
+            profiler.disable_profiling().write(arguments.profile)
@@ -3,10 +3,34 @@
 # Game Logic and Piece Classes for console Version
 
 import copy
+import random
+import struct
+import time
+from array import array
+from collections import OrderedDict
 
 WHITE = 1
 BLACK = -1
 
+# Packed moves are 16-bit ints: bits 0-5 are the from square, bits 6-11 the to square (square = row * 8 + col),
+# and bits 12-15 are flags. Move generation emits them directly; pack_move(), encode_move() and decode_move()
+# convert to and from the (Piece, row, col) moves of the console
+MOVE_QUIET = 0
+MOVE_DOUBLE_PAWN_PUSH = 1
+MOVE_KING_CASTLE = 2
+MOVE_QUEEN_CASTLE = 3
+MOVE_CAPTURE = 4
+MOVE_EN_PASSANT = 5
+MOVE_PROMOTION = 8  # The low two flag bits give the promotion piece; GameState only promotes to Queens
+PROMOTE_TO_QUEEN = 3
+
+# The mailbox board is a 10x12 bytearray of piece codes (square = 21 + row * 10 + col) surrounded by OFFBOARD
+# sentinels, so move generation never needs bounds checks. A piece code is the Piece class's code | its color bit
+EMPTY = 0
+WHITE_BIT = 8
+BLACK_BIT = 16
+OFFBOARD = 32
+
 
 class GameState:
     """
@@ -17,37 +41,159 @@ class GameState:
     Multiple GameStates can be used for future AI purposes
     """
 
-    def __init__(self):
+    def __init__(self, position_cache: 'PositionCache' = None):
         self.turn = WHITE  # Whose turn is it?
         self.check = 0  # This color is under check. check = 0 means there is no check
         self.both_checked = False  # True if both sides are in check (used for lookaheads only)
         self.mate = False  # True if checkmate, False if not
         self.stalemate = False  # True if stalemate is reached
         self.board = [[]]  # 2-D array of Pieces or None
+        self.mailbox = bytearray()  # 10x12 piece codes mirroring self.board (see _to_mailbox())
         self.pieces = set()  # set of Pieces
         #############################################
         # Only used for housekeeping purposes #
         self.black_queen_count = 1  # How many black queens in the game?
         self.white_queen_count = 1  # How many white queens in the game?
         #############################################
-        self.all_possible_moves = dict(dict())  # {Piece: {(row, col): Piece to capture}}
+        self.halfmove_clock = 0  # Moves since the last capture or Pawn move
+        self.fullmove_number = 1  # Starts at 1 and goes up after each Black move
+        self.pawn_key = 0  # Zobrist key of the Pawns alone, kept up to date move by move (see pawn_hash())
+        # Hashes of the positions since the last capture or Pawn move, newest first, as nested (hash, older) pairs
+        # that children share with their parent. Only these positions can ever come back (see repetition_count())
+        self.history = None
+        self._moves = array('H')  # Packed legal moves of the side to move (see legal_moves())
+        # all_possible_moves, {Piece: {(row, col): Piece to capture}} for the side to move, is only built from
+        # self._moves when something asks for it (see _build_move_view())
         self.lookahead = True  # Is this GameState allowed to look ahead?
+        self.position_cache = position_cache  # Optional PositionCache shared between GameStates
+        #############################################
+        # Copy-on-write bookkeeping for snapshot() and child() #
+        self._owner = object()  # Pieces tagged with this token belong to this GameState alone
+        self._shared = False  # True if board rows or Pieces may be shared with another GameState
+        self._owned_rows = set()  # Rows of self.board this GameState has already copied since sharing
+        self._pending = False  # True if move data and check variables have not been worked out yet
+        self._hash = None  # (turn, position_hash()) until the board next changes
+        #############################################
         self._initialize_game()
 
-    def execute_move(self, desired_move: ('Piece', int, int)) -> None:
+    def __getattr__(self, name: str):
+        """
+        Only called for attributes that are not set, which is how a child() works out its
+        move data and check variables, and any GameState its all_possible_moves, the first time they are used
+        """
+        if name == 'all_possible_moves':
+            self.all_possible_moves = self._build_move_view()
+            return self.all_possible_moves
+        if name in _LAZY_ATTRIBUTES and self.__dict__.get('_pending'):
+            self._materialize()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def execute_move(self, desired_move: '(Piece, int, int) or int') -> None:
         """
         Executes the given move on the board
-        :param desired_move: (Piece to move, desired row: int, desire column: int)
+        :param desired_move: (Piece to move, desired row: int, desire column: int) or a packed move from legal_moves()
         :return: None
         """
+        if self._pending:
+            self._materialize()
+        self._make_move(*self._resolve_move(desired_move))
+        self._change_turn()
+        self._refresh()
+
+    def snapshot(self) -> 'GameState':
+        """
+        Cheap copy of this GameState for branching (analysis trees, move browsing, search)
+        The copy shares board rows, Pieces and move data with this GameState; whichever one changes
+        first copies just the parts it changes, so neither can ever see the other's moves
+        :return: GameState
+        """
+        clone = object.__new__(GameState)
+        clone.__dict__.update(self.__dict__)
+        clone.board = list(self.board)
+        clone.mailbox = bytearray(self.mailbox)
+        clone.pieces = set(self.pieces)
+        for state in (self, clone):
+            state._owner = object()
+            state._shared = True
+            state._owned_rows = set()
+        return clone
+
+    def child(self, desired_move: '(Piece, int, int) or int') -> 'GameState':
+        """
+        The GameState after the given move, leaving this GameState untouched
+        The child only copies the rows and Pieces the move changed; its move data and check variables
+        are worked out the first time they are used, so unexplored children stay small and cheap
+        :param desired_move: (Piece to move, row, col) or a packed move from legal_moves()
+        :return: GameState
+        """
+        next_state = self.snapshot()
+        next_state._make_move(*self._resolve_move(desired_move))
+        next_state._defer_move_data()
+        next_state._change_turn()
+        return next_state
+
+    def null_child(self) -> 'GameState':
+        """
+        The GameState after the side to move passes without moving (a null move, only used by search pruning)
+        Like child(), its move data and check variables are worked out the first time they are used
+        :return: GameState
+        """
+        next_state = self.snapshot()
+        next_state.history = None  # Positions on either side of a pass don't repeat each other
+        next_state._defer_move_data()
+        next_state._change_turn()
+        return next_state
+
+    def _defer_move_data(self) -> None:
+        """Forget the move data and check variables so that they are worked out again the next time they are used"""
+        for name in _LAZY_ATTRIBUTES | {'all_possible_moves'}:
+            self.__dict__.pop(name, None)
+        self._pending = True
+
+    def _resolve_move(self, desired_move: '(Piece, int, int) or int') -> ('Piece', int, int, 'Piece or None'):
+        """
+        Find the Piece to move, the destination and the Piece to capture for either move format
+        :param desired_move: (Piece to move, row, col) or a packed move
+        :return: (Piece to move, row, col, Piece to capture or None)
+        """
+        if isinstance(desired_move, int):
+            return self._unpack_move(desired_move)
         piece, new_row, new_col = desired_move
+        return piece, new_row, new_col, self.all_possible_moves[piece][(new_row, new_col)]
+
+    def _make_move(self, piece: 'Piece', new_row: int, new_col: int, captured_square: 'Piece or None') -> None:
+        """
+        Move the Pieces on the board, including completing castles and converting pawns
+        :param piece: Piece to move
+        :param new_row: row to move to
+        :param new_col: column to move to
+        :param captured_square: Piece to capture or None
+        :return: None
+        """
+        if isinstance(piece, Pawn) or isinstance(captured_square, Piece):
+            self.halfmove_clock = 0
+            self.history = None
+        else:
+            self.halfmove_clock += 1
+            self.history = (self.position_hash(), self.history)
+        if self._shared:
+            piece = self._own_piece(self.board[piece.row][piece.col])
         old_col = piece.col
-        captured_square = self.all_possible_moves[piece][(new_row, new_col)]
+        if piece.color is BLACK:
+            self.fullmove_number += 1
         if isinstance(captured_square, Piece):
-            self.board[captured_square.row][captured_square.col] = None
+            captured_square = self.board[captured_square.row][captured_square.col]
+            if isinstance(captured_square, Pawn):
+                self.pawn_key ^= _ZOBRIST_PIECES[(Pawn, captured_square.color, captured_square.row,
+                                                  captured_square.col)]
+            self._set_square(captured_square.row, captured_square.col, None)
             self.pieces.remove(captured_square)
-        self.board[piece.row][piece.col] = None
-        self.board[new_row][new_col] = piece
+        if isinstance(piece, Pawn):
+            self.pawn_key ^= _ZOBRIST_PIECES[(Pawn, piece.color, piece.row, piece.col)] ^ \
+                _ZOBRIST_PIECES[(Pawn, piece.color, new_row, new_col)]
+        self._set_square(piece.row, piece.col, None)
+        self._set_square(new_row, new_col, piece)
         piece.move(new_row, new_col)
 
         if isinstance(piece, King) and abs(old_col - new_col) > 1:
@@ -55,10 +201,201 @@ class GameState:
         if isinstance(piece, Pawn) and (new_row == 0 or new_row == 7):
             self._convert_pawn(piece)
 
-        self._update_possible_moves()
-        self._check_for_check()
-        self._check_for_stalemate()
-        self._change_turn()
+    def _refresh(self) -> None:
+        """
+        Work out the legal moves and check variables after a move, once the turn has passed to the side to move
+        :return: None
+        """
+        if self.position_cache is not None and self.lookahead:
+            self._update_from_cache()
+        else:
+            self._update_possible_moves()
+            self._check_for_check()
+            self._check_for_stalemate()
+
+    def _materialize(self) -> None:
+        """
+        Work out the move data and check variables that child() or from_bytes() put off
+        Check variables that are already known are kept as they are
+        :return: None
+        """
+        known = {name: self.__dict__[name] for name in _LAZY_ATTRIBUTES if name in self.__dict__}
+        self._pending = False
+        self.__dict__.update(check=0, both_checked=False, mate=False, stalemate=False)
+        self._refresh()
+        self.__dict__.update(known)
+
+    def to_bytes(self) -> bytes:
+        """
+        Pack this GameState into SERIALIZED_SIZE bytes for other processes or for disk:
+        board, turn, castling and en passant flags, queen counters, clocks and check variables
+        GameState.from_bytes() turns the bytes back into an equal GameState
+        :return: bytes
+        """
+        squares = bytearray(64)
+        flags = 0  # One bit per square: en passant for Pawns, can_castle for Rooks and Kings
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if isinstance(piece, Piece):
+                    squares[row * 8 + col] = _piece_to_byte(piece)
+                    if getattr(piece, 'en_passant', False) or getattr(piece, 'can_castle', False):
+                        flags |= 1 << (row * 8 + col)
+
+        if 'check' in self.__dict__:
+            status = (self.check is WHITE) | (self.check is BLACK) << 1 | self.both_checked << 2 | \
+                self.mate << 3 | self.stalemate << 4
+        else:
+            status = _STATUS_UNKNOWN  # A child() that was never looked at; from_bytes() works it out lazily too
+        return _SERIAL_HEADER.pack(_SERIAL_VERSION, self.turn is BLACK, self.white_queen_count,
+                                   self.black_queen_count, status, self.halfmove_clock, self.fullmove_number,
+                                   flags) + bytes(squares)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, position_cache: 'PositionCache' = None) -> 'GameState':
+        """
+        Rebuild a GameState packed by to_bytes()
+        Move data is only worked out the first time it is used, like a child()
+        :param data: bytes from to_bytes()
+        :param position_cache: Optional PositionCache for the new GameState
+        :return: GameState
+        """
+        if len(data) != SERIALIZED_SIZE:
+            raise ValueError('Expected {} bytes, got {}'.format(SERIALIZED_SIZE, len(data)))
+        version, is_black_turn, white_queens, black_queens, status, halfmove_clock, fullmove_number, flags = \
+            _SERIAL_HEADER.unpack_from(data)
+        if version != _SERIAL_VERSION:
+            raise ValueError('Unknown GameState format version {}'.format(version))
+
+        game_state = object.__new__(cls)
+        game_state.__dict__.update(
+            turn=BLACK if is_black_turn else WHITE, board=[[None] * 8 for _ in range(8)],
+            mailbox=_empty_mailbox(), pieces=set(), black_queen_count=black_queens,
+            white_queen_count=white_queens, halfmove_clock=halfmove_clock, fullmove_number=fullmove_number,
+            lookahead=True, position_cache=position_cache, history=None, _owner=object(), _shared=False,
+            _owned_rows=set(), _pending=True, _hash=None)
+        if status != _STATUS_UNKNOWN:
+            game_state.check = WHITE if status & 1 else BLACK if status & 2 else 0
+            game_state.both_checked = bool(status & 4)
+            game_state.mate = bool(status & 8)
+            game_state.stalemate = bool(status & 16)
+
+        for index, code in enumerate(data[_SERIAL_HEADER.size:]):
+            if code:
+                piece = _piece_from_byte(code, index >> 3, index & 7, bool(flags >> index & 1))
+                game_state.pieces.add(piece)
+                game_state._set_square(piece.row, piece.col, piece)
+        game_state.pawn_key = game_state.pawn_hash()
+        return game_state
+
+    def _own_piece(self, piece: 'Piece') -> 'Piece':
+        """
+        Make sure this GameState has its own copy of a Piece before changing it
+        :param piece: Piece on self.board
+        :return: the Piece this GameState may change
+        """
+        if piece._owner is self._owner:
+            return piece
+        clone = copy.copy(piece)
+        clone._owner = self._owner
+        self.pieces.remove(piece)
+        self.pieces.add(clone)
+        self._set_square(piece.row, piece.col, clone)
+        return clone
+
+    def legal_moves(self) -> array:
+        """
+        All legal moves for the side whose turn it is, packed into an array of 16-bit ints
+        The array is shared with snapshots and the PositionCache, so read it without changing it
+        :return: array('H') of packed moves
+        """
+        return self._moves
+
+    def _build_move_view(self) -> {'Piece': {(int, int): 'Piece or None'}}:
+        """
+        Unpack legal_moves() into the {Piece: {(row, col): Piece to capture}} dicts the console reads,
+        with an entry for every Piece of the side to move
+        :return: all_possible_moves
+        """
+        moves = self.legal_moves()
+        view = {square: dict() for row in self.board for square in row
+                if isinstance(square, Piece) and square.color is self.turn}
+        for move in moves:
+            piece, row, col, capture = self._unpack_move(move)
+            view[piece][(row, col)] = capture
+        return view
+
+    def _unpack_move(self, move: int) -> ('Piece', int, int, 'Piece or None'):
+        """
+        Find the Piece to move, the destination and the Piece to capture for a packed move
+        :param move: packed move
+        :return: (Piece to move, row, col, Piece to capture or None)
+        """
+        from_square, to_square, flags = move & 0x3F, (move >> 6) & 0x3F, move >> 12
+        piece = self.board[from_square >> 3][from_square & 7]
+        new_row, new_col = to_square >> 3, to_square & 7
+        if flags == MOVE_EN_PASSANT:
+            return piece, new_row, new_col, self.board[piece.row][new_col]
+        if flags & MOVE_CAPTURE:
+            return piece, new_row, new_col, self.board[new_row][new_col]
+        return piece, new_row, new_col, None
+
+    def position_hash(self) -> int:
+        """
+        Zobrist hash of everything that decides the possible moves: Pieces, castling and en passant flags, and turn
+        It is remembered until the board next changes
+        :return: 64-bit int
+        """
+        if self._hash is not None and self._hash[0] is self.turn:
+            return self._hash[1]
+        key = _ZOBRIST_TURN if self.turn is BLACK else 0
+        for row in self.board:
+            for square in row:
+                if isinstance(square, Piece):
+                    key ^= _ZOBRIST_PIECES[(type(square), square.color, square.row, square.col)]
+                    if getattr(square, 'en_passant', False) or getattr(square, 'can_castle', False):
+                        key ^= _ZOBRIST_FLAGS[(square.row, square.col)]
+        self._hash = (self.turn, key)
+        return key
+
+    def repetition_count(self) -> int:
+        """
+        How many times this position has been reached, counting this time. Only the positions since the last
+        capture or Pawn move are looked at, since no earlier one can come back
+        :return: int
+        """
+        key = self.position_hash()
+        count = 1
+        entry = self.history
+        while entry is not None:
+            if entry[0] == key:
+                count += 1
+            entry = entry[1]
+        return count
+
+    def is_threefold_repetition(self) -> bool:
+        """True if this position has been reached three times, which makes the game a draw"""
+        return self.repetition_count() >= 3
+
+    def is_fifty_move_rule(self) -> bool:
+        """True if both sides have made fifty moves without a capture or a Pawn move, which makes the game a draw"""
+        return self.halfmove_clock >= 100
+
+    def is_draw(self) -> bool:
+        """True if the game is drawn by stalemate, threefold repetition or the fifty-move rule"""
+        return self.stalemate or self.is_fifty_move_rule() or self.is_threefold_repetition()
+
+    def pawn_hash(self) -> int:
+        """
+        Zobrist hash of the Pawns alone, worked out from scratch (self.pawn_key is the same value, kept up to date
+        by every move), for caching evaluation of the pawn structure
+        :return: 64-bit int
+        """
+        key = 0
+        for piece in self.pieces:
+            if isinstance(piece, Pawn):
+                key ^= _ZOBRIST_PIECES[(Pawn, piece.color, piece.row, piece.col)]
+        return key
 
     def undo(self) -> None:
         """
@@ -67,6 +404,41 @@ class GameState:
         """
         pass
 
+    def _update_from_cache(self) -> None:
+        """
+        Same as updating possible moves and checking for check and stalemate, but reuses
+        the results from self.position_cache if this position has been seen before
+        :return: None
+        """
+        key = self.position_hash()
+        entry = self.position_cache.get(key)
+        if entry is not None:
+            self._restore_cache_entry(entry)
+            return
+
+        was_mate, was_stalemate = self.mate, self.stalemate
+        self.mate = self.stalemate = False
+        self._update_possible_moves()
+        self._check_for_check()
+        self._check_for_stalemate()
+        self.position_cache.put(key, (self._moves, self.check, self.both_checked, self.mate, self.stalemate))
+        self.mate = self.mate or was_mate
+        self.stalemate = self.stalemate or was_stalemate
+
+    def _restore_cache_entry(self, entry: tuple) -> None:
+        """
+        Take the legal moves and the check variables from a PositionCache entry
+        :param entry: (packed moves, check, both_checked, mate, stalemate)
+        :return: None
+        """
+        self._moves, check, both_checked, mate, stalemate = entry
+        self.__dict__.pop('all_possible_moves', None)
+        if not both_checked:
+            self.check = check
+        self.both_checked = both_checked
+        self.mate = self.mate or mate
+        self.stalemate = self.stalemate or stalemate
+
     def _convert_pawn(self, pawn: 'Pawn') -> None:
         """
         Converts a pawn at the end of the board to a Queen
@@ -74,14 +446,16 @@ class GameState:
         :return: None
         """
         self.pieces.remove(pawn)
+        self.pawn_key ^= _ZOBRIST_PIECES[(Pawn, pawn.color, pawn.row, pawn.col)]
         if pawn.color is BLACK:
             self.black_queen_count += 1
             queen = Queen(pawn.row, pawn.col, pawn.color, "BQ" + str(self.black_queen_count))
         else:
             self.white_queen_count += 1
             queen = Queen(pawn.row, pawn.col, pawn.color, "WQ" + str(self.white_queen_count))
+        queen._owner = self._owner
         self.pieces.add(queen)
-        self.board[queen.row][queen.col] = queen
+        self._set_square(queen.row, queen.col, queen)
 
     def _complete_castle(self, row: int, new_col: int) -> None:
         """
@@ -90,64 +464,143 @@ class GameState:
         :param new_col: The column that the King just moved to
         :return: None
         """
-        if new_col == 6:
-            self.board[row][5] = self.board[row][7]
-            self.board[row][7] = None
-            self.board[row][5].col = 5
-        else:
-            self.board[row][3] = self.board[row][0]
-            self.board[row][0] = None
-            self.board[row][3].col = 3
+        rook_col, new_rook_col = (7, 5) if new_col == 6 else (0, 3)
+        rook = self.board[row][rook_col]
+        if self._shared:
+            rook = self._own_piece(rook)
+        self._set_square(row, new_rook_col, rook)
+        self._set_square(row, rook_col, None)
+        rook.col = new_rook_col
+
+    def _set_square(self, row: int, col: int, piece: 'Piece or None') -> None:
+        """
+        Put a Piece (or None) on a square, keeping self.board and self.mailbox in sync
+        :param row: row of the square
+        :param col: column of the square
+        :param piece: Piece or None
+        :return: None
+        """
+        if self._shared and row not in self._owned_rows:
+            self.board[row] = list(self.board[row])
+            self._owned_rows.add(row)
+        self.board[row][col] = piece
+        self._hash = None
+        self.mailbox[_to_mailbox(row, col)] = EMPTY if piece is None else piece.piece_code()
 
     def _update_possible_moves(self) -> None:
         """
-        After completing the move, update the possible moves for the next turn
+        After completing the move, work out the legal moves of the side to move
         :return: None
         """
-        self.all_possible_moves.clear()
+        moves = array('H')
         for row in self.board:
             for square in row:
-                if isinstance(square, Piece):
-                    self.pieces.add(square)
-                    square.calculate_possible_moves(self.board)
-                    self.all_possible_moves[square] = square.possible_moves
+                if isinstance(square, Piece) and square.color is self.turn:
+                    square.calculate_possible_moves(self.board, self.mailbox, moves)
+        self._moves = moves
+        self.__dict__.pop('all_possible_moves', None)
         if self.lookahead:
             self._lookahead_for_check()
 
     def _lookahead_for_check(self) -> None:
         """
-        Only use this method to go through all_possible_moves and eliminate any moves that
-        could result in erroneous check.  This method can go infintely recursive if not for self.lookahead
+        Only use this method to go through the generated moves and eliminate any moves that
+        would leave the moving side's own King under attack, including castles out of or through check
+        Each move is tried on the mailbox and immediately taken back, so no GameState has to be copied
         :return: None
         """
-        moves_copy = copy.deepcopy(self.all_possible_moves)
-        for piece, moves in moves_copy.items():
-            for row, col in moves.keys():
-                next_state = copy.deepcopy(self)
-                next_state.lookahead = False
-                next_state.execute_move((_get_equivalent_piece(piece, next_state), row, col))
-                if next_state.check == -self.turn or next_state.both_checked:
-                    self.all_possible_moves[_get_equivalent_piece(piece, self)].pop((row, col))
+        king = self._find_kings().get(self.turn)
+        if king is None:
+            return
+        king_square = _to_mailbox(king.row, king.col)
+        self._moves = array('H', [move for move in self._moves if self._is_move_safe(move, king_square)])
+
+    def _is_move_safe(self, move: int, king_square: int) -> bool:
+        """
+        Try a move on the mailbox and see whether the moving side's King would be under attack afterwards
+        :param move: packed move of the side to move
+        :param king_square: mailbox square of the moving side's King
+        :return: True if the move does not leave the King under attack
+        """
+        mailbox = self.mailbox  # Only the mailbox is touched, so the board view never shows the trial move
+        from_square, to_square, flags = MAILBOX_SQUARES[move & 0x3F], MAILBOX_SQUARES[(move >> 6) & 0x3F], move >> 12
+        if flags == MOVE_KING_CASTLE or flags == MOVE_QUEEN_CASTLE:  # May not start in, pass through, or end in check
+            step = 1 if to_square > from_square else -1
+            return not any(_is_square_attacked(mailbox, square, -self.turn)
+                           for square in range(from_square, to_square + step, step))
+
+        moving_code, landing_code = mailbox[from_square], mailbox[to_square]
+        mailbox[from_square] = EMPTY
+        if flags == MOVE_EN_PASSANT:  # The captured Pawn is beside the moving one, not on the landing square
+            capture_square = from_square - from_square % 10 + to_square % 10
+            capture_code = mailbox[capture_square]
+            mailbox[capture_square] = EMPTY
+        mailbox[to_square] = moving_code
+        is_safe = not _is_square_attacked(mailbox, to_square if from_square == king_square else king_square, -self.turn)
+        mailbox[to_square] = landing_code
+        if flags == MOVE_EN_PASSANT:
+            mailbox[capture_square] = capture_code
+        mailbox[from_square] = moving_code
+        return is_safe
+
+    def is_square_attacked(self, square: (int, int), by_color: int) -> bool:
+        """
+        Is this square attacked by any Piece of the given color?
+        Works outward from the square along rays and knight/pawn patterns instead of scanning every Piece's moves
+        :param square: (row, col)
+        :param by_color: WHITE or BLACK
+        :return: bool
+        """
+        return _is_square_attacked(self.mailbox, _to_mailbox(square[0], square[1]), by_color)
+
+    def static_exchange(self, move: int, values: {type: int}) -> int:
+        """
+        Static exchange evaluation of one of the legal moves: the material the side to move wins if both sides
+        keep recapturing on its to square with their least valuable attacker for as long as it pays (pins are ignored)
+        :param move: packed move from legal_moves()
+        :param values: value of each Piece class; Kings should be worth more than everything else together
+        :return: material gained, in the units of values
+        """
+        mailbox = bytearray(self.mailbox)
+        origin, target, flags = MAILBOX_SQUARES[move & 0x3F], MAILBOX_SQUARES[(move >> 6) & 0x3F], move >> 12
+        captured_square = origin - origin % 10 + target % 10 if flags == MOVE_EN_PASSANT else target
+        captured = mailbox[captured_square] if flags & MOVE_CAPTURE else EMPTY
+        gains = [values[_PIECE_TYPES[captured & 7]] if captured else 0]
+        on_square = values[_PIECE_TYPES[mailbox[origin] & 7]]
+        mailbox[origin] = mailbox[captured_square] = EMPTY
+        color = -self.turn
+        while True:
+            attacker = _least_valuable_attacker(mailbox, target, color)
+            if not attacker:
+                break
+            gains.append(on_square - gains[-1])
+            on_square = values[_PIECE_TYPES[mailbox[attacker] & 7]]
+            mailbox[attacker] = EMPTY
+            color = -color
+        while len(gains) > 1:
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    def _find_kings(self) -> {int: 'King'}:
+        """Helper to find the King of each color that is still on the board"""
+        return {piece.color: piece for piece in self.pieces if isinstance(piece, King)}
 
     def _check_for_check(self) -> None:
         """
-        Go through all_possible_moves and see if a king is under fire. If so, update check variables
+        See if either King is under attack. If so, update check variables
         :return: None
         """
-        is_self_under_check = False
-        is_other_under_check = False
-        for move_dict in self.all_possible_moves.values():
-            for capture in move_dict.values():
-                if isinstance(capture, King):
-                    if capture.color is self.turn:
-                        is_self_under_check = True
-                    else:
-                        is_other_under_check = True
-
-        if is_self_under_check and is_other_under_check:
+        kings = self._find_kings()
+        is_mover_under_check = -self.turn in kings and \
+            self.is_square_attacked((kings[-self.turn].row, kings[-self.turn].col), self.turn)
+        is_side_to_move_under_check = self.turn in kings and \
+            self.is_square_attacked((kings[self.turn].row, kings[self.turn].col), -self.turn)
+
+        if is_mover_under_check and is_side_to_move_under_check:
             self.both_checked = True
-        elif is_other_under_check:
-            self.check = -self.turn
+        elif is_side_to_move_under_check:
+            self.check = self.turn
             self.both_checked = False
             self._check_for_mate()
         else:
@@ -156,13 +609,11 @@ class GameState:
 
     def _check_for_mate(self) -> None:
         """
-        If one side is under check, check for checkmate
+        If the side to move is under check, check for checkmate
         :return: None
         """
-        for piece in self.pieces:
-            if piece.color is self.check and len(piece.possible_moves) != 0:
-                return
-        self.mate = True
+        if not self._moves:
+            self.mate = True
 
     def _check_for_stalemate(self) -> None:
         """
@@ -170,13 +621,7 @@ class GameState:
         make self.stalemate = True
         :return:
         """
-        for piece, moves in self.all_possible_moves.items():
-            if piece.color is not self.turn and len(moves) != 0:
-                break
-        else:
-            self.stalemate = True
-
-        if len(self.all_possible_moves) == 2:
+        if not self._moves or len(self.pieces) == 2:
             self.stalemate = True
 
     def _change_turn(self) -> None:
@@ -204,23 +649,80 @@ class GameState:
         self.board[7][2], self.board[7][5] = Bishop(7, 2, WHITE, "WB1"), Bishop(7, 5, WHITE, "WB2")
         self.board[7][3] = Queen(7, 3, WHITE, "WQ1")
         self.board[7][4] = King(WHITE)
+
+        self.mailbox = _empty_mailbox()
+        for row in range(8):
+            for col in range(8):
+                self._set_square(row, col, self.board[row][col])
+                if self.board[row][col] is not None:
+                    self.pieces.add(self.board[row][col])
         self._update_possible_moves()
+        self.pawn_key = self.pawn_hash()
+
+
+class PositionCache:
+    """
+    Bounded LRU cache of possible moves and check/mate/stalemate results, keyed by GameState.position_hash()
+    Share one PositionCache between GameStates that keep revisiting the same positions (analysis, move browsing)
+    """
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # {position hash: cache entry}, least recently used first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __deepcopy__(self, memo):
+        return self  # Copies of a GameState keep sharing the same cache
+
+    def get(self, key: int) -> 'tuple or None':
+        """Return the entry for this key (marking it as recently used), or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: int, entry: tuple) -> None:
+        """Store an entry, evicting the least recently used ones if the cache is full"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every entry and reset the statistics"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Snapshot of the cache size and hit/miss counts"""
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
 
 
 class Piece:
     """
     The base class for all Pieces
-    Pieces do all their own calculations for possible moves, then GameState compiles possible moves from all Pieces
+    Pieces do all their own calculations for possible moves, appending them packed to the GameState's move list
     Pieces do not have knowledge of the GameState, only the board
     Pieces do not take into account check and checkmate calculations
     GameState must go through and remove all possible moves that violate check(mate) rules
     """
+    code = EMPTY  # Mailbox piece code, set by each subclass
+    _owner = None  # Token of the GameState that may change this Piece (see GameState.snapshot())
+
     def __init__(self, row: int, col: int, color: int, name: str):
         self.row = row
         self.col = col
         self.color = color
         self.name = name
-        self.possible_moves = dict()  # {(row, col): Piece to capture}
 
     def __str__(self):
         return self.name
@@ -228,112 +730,54 @@ class Piece:
     def __repr__(self):
         return self.name
 
-    def add_move_to_possibles(self, board: [['Piece']], row: int, col: int) -> None:
-        """Helper to add a certain a move to this Piece's possible moves"""
-        self.possible_moves[(row, col)] = board[row][col]
-
-    # The following methods are used by different types of Pieces to calculate possible moves in different directions
-    def explore_upper_right_diagonal(self, board: [['Piece']]) -> None:
-        row, col = self.row - 1, self.col + 1
-        while row >= 0 and col <= 7:
-            if _is_space_occupied(board, row, col):
-                if board[row][col].color is not self.color:
-                    self.add_move_to_possibles(board, row, col)
-                break
-            else:
-                self.add_move_to_possibles(board, row, col)
-            row -= 1
-            col += 1
-
-    def explore_upper_left_diagonal(self, board: [['Piece']]) -> None:
-        row, col = self.row - 1, self.col - 1
-        while row >= 0 and col >= 0:
-            if _is_space_occupied(board, row, col):
-                if board[row][col].color is not self.color:
-                    self.add_move_to_possibles(board, row, col)
-                break
-            else:
-                self.add_move_to_possibles(board, row, col)
-            row -= 1
-            col -= 1
-
-    def explore_lower_right_diagonal(self, board: [['Piece']]) -> None:
-        row, col = self.row + 1, self.col + 1
-        while row <= 7 and col <= 7:
-            if _is_space_occupied(board, row, col):
-                if board[row][col].color is not self.color:
-                    self.add_move_to_possibles(board, row, col)
-                break
-            else:
-                self.add_move_to_possibles(board, row, col)
-            row += 1
-            col += 1
-
-    def explore_lower_left_diagonal(self, board: [['Piece']]) -> None:
-        row, col = self.row + 1, self.col - 1
-        while row <= 7 and col >= 0:
-            if _is_space_occupied(board, row, col):
-                if board[row][col].color is not self.color:
-                    self.add_move_to_possibles(board, row, col)
-                break
-            else:
-                self.add_move_to_possibles(board, row, col)
-            row += 1
-            col -= 1
-
-    def explore_up(self, board: [['Piece']]) -> None:
-        row = self.row - 1
-        while row >= 0:
-            if _is_space_occupied(board, row, self.col):
-                if board[row][self.col].color is not self.color:
-                    self.add_move_to_possibles(board, row, self.col)
-                break
-            else:
-                self.add_move_to_possibles(board, row, self.col)
-            row -= 1
-
-    def explore_down(self, board: [['Piece']]) -> None:
-        row = self.row + 1
-        while row <= 7:
-            if _is_space_occupied(board, row, self.col):
-                if board[row][self.col].color is not self.color:
-                    self.add_move_to_possibles(board, row, self.col)
-                break
-            else:
-                self.add_move_to_possibles(board, row, self.col)
-            row += 1
-
-    def explore_right(self, board: [['Piece']]) -> None:
-        col = self.col + 1
-        while col <= 7:
-            if _is_space_occupied(board, self.row, col):
-                if board[self.row][col].color is not self.color:
-                    self.add_move_to_possibles(board, self.row, col)
-                break
-            else:
-                self.add_move_to_possibles(board, self.row, col)
-            col += 1
-
-    def explore_left(self, board: [['Piece']]) -> None:
-        col = self.col - 1
-        while col >= 0:
-            if _is_space_occupied(board, self.row, col):
-                if board[self.row][col].color is not self.color:
-                    self.add_move_to_possibles(board, self.row, col)
-                break
-            else:
-                self.add_move_to_possibles(board, self.row, col)
-            col -= 1
+    def piece_code(self) -> int:
+        """This Piece's code on the mailbox board"""
+        return self.code | (WHITE_BIT if self.color is WHITE else BLACK_BIT)
 
-    def calculate_possible_moves(self, board: [['Piece']]) -> None:
+    def explore_ray(self, mailbox: bytearray, moves: array, step: int) -> None:
+        """
+        Used by sliding Pieces to add every move in one direction, up to and including the first capture
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
+        :param step: mailbox offset of one step in this direction
+        :return: None
+        """
+        origin = self.row * 8 + self.col
+        square = _to_mailbox(self.row, self.col) + step
+        while mailbox[square] == EMPTY:
+            moves.append(origin | _TO_BITS[square])
+            square += step
+        if mailbox[square] & _own_bits(-self.color):
+            moves.append(origin | _TO_BITS[square] | MOVE_CAPTURE << 12)
+
+    def explore_steps(self, mailbox: bytearray, moves: array, steps: (int,)) -> None:
+        """
+        Used by Knights and Kings to add each single-step move that isn't blocked by their own side
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
+        :param steps: mailbox offsets to try
+        :return: None
+        """
+        origin, square = self.row * 8 + self.col, _to_mailbox(self.row, self.col)
+        enemy_bits = _own_bits(-self.color)
+        for step in steps:
+            code = mailbox[square + step]
+            if code == EMPTY:
+                moves.append(origin | _TO_BITS[square + step])
+            elif code & enemy_bits:
+                moves.append(origin | _TO_BITS[square + step] | MOVE_CAPTURE << 12)
+
+    def calculate_possible_moves(self, board: [['Piece']], mailbox: bytearray, moves: array) -> None:
         """
         Must be overridden by subclasses
-        Uses algorithms to add physically possible moves to this Piece's dictionary of moves
+        Uses algorithms to append this Piece's physically possible moves, packed, to moves
         """
         pass
 
 
 class Pawn(Piece):
+    code = 1
+
     def __init__(self, col: int, color: int):
         if color is WHITE:
             row = 6
@@ -360,88 +804,39 @@ class Pawn(Piece):
         self.row = new_row
         self.col = new_col
 
-    def calculate_possible_moves(self, board: [[Piece]]) -> None:
-        """
-        Since pawns move uniquely, this function and its two helpers are only in class Pawn
-        :param board: [[Piece or None]]
-        :return: None
-        """
-        self.possible_moves.clear()
-        if self.color is WHITE:
-            self._calculate_white_moves(board)
-        else:
-            self._calculate_black_moves(board)
-
-    def _calculate_white_moves(self, board: [[Piece]]) -> None:
-        """
-        Calculate possible moves if this Pawn is White
-        :param board: [[Piece or None]]
-        :return: None
+    def calculate_possible_moves(self, board: [[Piece]], mailbox: bytearray, moves: array) -> None:
         """
-        if self.row == 6:  # Jumps
-            if _is_space_empty(board, self.row - 1, self.col) and \
-                    _is_space_empty(board, self.row - 2, self.col):
-                self.add_move_to_possibles(board, self.row - 2, self.col)
-        if 0 < self.row < 7:
-            if _is_space_empty(board, self.row - 1, self.col):  # Pushes
-                self.add_move_to_possibles(board, self.row - 1, self.col)
-            if self.col != 7:  # Right Captures and En Passants
-                if _is_space_occupied(board, self.row - 1, self.col + 1) and \
-                        board[self.row - 1][self.col + 1].color is BLACK:  # Capture
-                    self.add_move_to_possibles(board, self.row - 1, self.col + 1)
-                if _is_space_occupied(board, self.row, self.col + 1) and \
-                        _is_space_empty(board, self.row - 1, self.col + 1) and \
-                        isinstance(board[self.row][self.col + 1], Pawn) and \
-                        board[self.row][self.col + 1].color is BLACK and \
-                        board[self.row][self.col + 1].en_passant:  # En Passant
-                    self.possible_moves[(self.row - 1, self.col + 1)] = board[self.row][self.col + 1]
-            if self.col != 0:  # Left Captures and En Passants
-                if _is_space_occupied(board, self.row - 1, self.col - 1) and \
-                        board[self.row - 1][self.col - 1].color is BLACK:  # Capture
-                    self.add_move_to_possibles(board, self.row - 1, self.col - 1)
-                if _is_space_occupied(board, self.row, self.col - 1) and \
-                        _is_space_empty(board, self.row - 1, self.col - 1) and \
-                        isinstance(board[self.row][self.col - 1], Pawn) and \
-                        board[self.row][self.col - 1].color is BLACK and \
-                        board[self.row][self.col - 1].en_passant:  # En Passant
-                    self.possible_moves[(self.row - 1, self.col - 1)] = board[self.row][self.col - 1]
-
-    def _calculate_black_moves(self, board: [[Piece]]) -> None:
-        """
-        Calculate possible moves if this Pawn is Black
+        Since pawns move uniquely, this function handles pushes, jumps, captures and en passants itself
+        White Pawns move up the board (towards row 0) and Black Pawns move down
         :param board: [[Piece or None]]
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
-        if self.row == 1:  # Jumps
-            if _is_space_empty(board, self.row + 1, self.col) and \
-                    _is_space_empty(board, self.row + 2, self.col):
-                self.add_move_to_possibles(board, self.row + 2, self.col)
-        if 0 < self.row < 7:
-            if _is_space_empty(board, self.row + 1, self.col):  # Pushes
-                self.add_move_to_possibles(board, self.row + 1, self.col)
-            if self.col != 7:  # Right Captures and En Passants
-                if _is_space_occupied(board, self.row + 1, self.col + 1) and \
-                        board[self.row + 1][self.col + 1].color is WHITE:  # Capture
-                    self.add_move_to_possibles(board, self.row + 1, self.col + 1)
-                if _is_space_occupied(board, self.row, self.col + 1) and \
-                        _is_space_empty(board, self.row + 1, self.col + 1) and \
-                        isinstance(board[self.row][self.col + 1], Pawn) and \
-                        board[self.row][self.col + 1].color is WHITE and \
-                        board[self.row][self.col + 1].en_passant:  # En Passant
-                    self.possible_moves[(self.row + 1, self.col + 1)] = board[self.row][self.col + 1]
-            if self.col != 0:  # Left Captures and En Passants
-                if _is_space_occupied(board, self.row + 1, self.col - 1) and \
-                        board[self.row + 1][self.col - 1].color is WHITE:  # Capture
-                    self.add_move_to_possibles(board, self.row + 1, self.col - 1)
-                if _is_space_occupied(board, self.row, self.col - 1) and \
-                        _is_space_empty(board, self.row + 1, self.col - 1) and \
-                        isinstance(board[self.row][self.col - 1], Pawn) and \
-                        board[self.row][self.col - 1].color is WHITE and \
-                        board[self.row][self.col - 1].en_passant:  # En Passant
-                    self.possible_moves[(self.row + 1, self.col - 1)] = board[self.row][self.col - 1]
+        if not 0 < self.row < 7:
+            return
+        origin, square = self.row * 8 + self.col, _to_mailbox(self.row, self.col)
+        forward = -10 if self.color is WHITE else 10
+        enemy_bits = _own_bits(-self.color)
+        start_row, promotion_row = (6, 1) if self.color is WHITE else (1, 6)
+        promotion = (MOVE_PROMOTION | PROMOTE_TO_QUEEN) << 12 if self.row == promotion_row else 0
+
+        if mailbox[square + forward] == EMPTY:  # Pushes and Jumps
+            moves.append(origin | _TO_BITS[square + forward] | promotion)
+            if self.row == start_row and mailbox[square + 2 * forward] == EMPTY:
+                moves.append(origin | _TO_BITS[square + 2 * forward] | MOVE_DOUBLE_PAWN_PUSH << 12)
+        for side in (1, -1):  # Right and Left Captures and En Passants
+            target = square + forward + side
+            if mailbox[target] & enemy_bits:  # Capture
+                moves.append(origin | _TO_BITS[target] | MOVE_CAPTURE << 12 | promotion)
+            elif mailbox[target] == EMPTY and mailbox[square + side] == Pawn.code | enemy_bits:
+                if board[self.row][self.col + side].en_passant:  # En Passant
+                    moves.append(origin | _TO_BITS[target] | MOVE_EN_PASSANT << 12)
 
 
 class Knight(Piece):
+    code = 2
+
     def __init__(self, row: int, col: int, color: int, name: str):
         Piece.__init__(self, row, col, color, name)
 
@@ -455,24 +850,20 @@ class Knight(Piece):
         self.row = new_row
         self.col = new_col
 
-    def calculate_possible_moves(self, board: [[Piece]]) -> None:
+    def calculate_possible_moves(self, board: [[Piece]], mailbox: bytearray, moves: array) -> None:
         """
-        Since knights move uniquely and succinctly, this function needs no external helpers
+        Since knights move uniquely and succinctly, Piece.explore_steps() with the knight jumps suffices
         :param board: [[Piece or None]]
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
-        self.possible_moves.clear()
-        possibles = {(self.row + 1, self.col - 2), (self.row - 1, self.col - 2),
-                     (self.row + 1, self.col + 2), (self.row - 1, self.col + 2),
-                     (self.row + 2, self.col - 1), (self.row + 2, self.col + 1),
-                     (self.row - 2, self.col - 1), (self.row - 2, self.col + 1)}
-        for row, col in possibles:
-            if _in_bounds(row, col):
-                if _is_space_empty(board, row, col) or board[row][col].color is not self.color:
-                    self.add_move_to_possibles(board, row, col)
+        self.explore_steps(mailbox, moves, _KNIGHT_STEPS)
 
 
 class Bishop(Piece):
+    code = 3
+
     def __init__(self, row: int, col: int, color: int, name: str):
         Piece.__init__(self, row, col, color, name)
 
@@ -486,26 +877,21 @@ class Bishop(Piece):
         self.row = new_row
         self.col = new_col
 
-    def calculate_possible_moves(self, board: [[Piece]]) -> None:
+    def calculate_possible_moves(self, board: [[Piece]], mailbox: bytearray, moves: array) -> None:
         """
         Bishop only needs to work in diagonals, so Piece functions suffice
-        Only calculate certain diagonals if in certain areas of the board
         :param board: [[Piece or None]]
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
-        self.possible_moves.clear()
-
-        if self.row > 0 and self.col < 7:
-            Piece.explore_upper_right_diagonal(self, board)
-        if self.row > 0 and self.col > 0:
-            Piece.explore_upper_left_diagonal(self, board)
-        if self.row < 7 and self.col < 7:
-            Piece.explore_lower_right_diagonal(self, board)
-        if self.row < 7 and self.col > 0:
-            Piece.explore_lower_left_diagonal(self, board)
+        for step in _DIAGONAL_STEPS:
+            self.explore_ray(mailbox, moves, step)
 
 
 class Rook(Piece):
+    code = 4
+
     def __init__(self, row: int, col: int, color: int, name: str):
         Piece.__init__(self, row, col, color, name)
         self.can_castle = True
@@ -522,26 +908,21 @@ class Rook(Piece):
         self.col = new_col
         self.can_castle = False
 
-    def calculate_possible_moves(self, board: [[Piece]]) -> None:
+    def calculate_possible_moves(self, board: [[Piece]], mailbox: bytearray, moves: array) -> None:
         """
         Rook only needs to work in orthogonals, so Piece functions suffice
-        Only calculate certain orthogonals if in certain areas of the board
         :param board: [[Piece or None]]
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
-        self.possible_moves.clear()
-
-        if self.row > 0:
-            Piece.explore_up(self, board)
-        if self.row < 7:
-            Piece.explore_down(self, board)
-        if self.col < 7:
-            Piece.explore_right(self, board)
-        if self.col > 0:
-            Piece.explore_left(self, board)
+        for step in _ORTHOGONAL_STEPS:
+            self.explore_ray(mailbox, moves, step)
 
 
 class Queen(Piece):
+    code = 5
+
     def __init__(self, row: int, col: int, color: int, name: str):
         Piece.__init__(self, row, col, color, name)
 
@@ -555,34 +936,21 @@ class Queen(Piece):
         self.row = new_row
         self.col = new_col
 
-    def calculate_possible_moves(self, board: [[Piece]]) -> None:
+    def calculate_possible_moves(self, board: [[Piece]], mailbox: bytearray, moves: array) -> None:
         """
         Queen is both a Rook and Bishop so simply merge those two functions together into one
         :param board: [[Piece or None]]
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
-        self.possible_moves.clear()
-
-        if self.row > 0 and self.col < 7:
-            Piece.explore_upper_right_diagonal(self, board)
-        if self.row > 0 and self.col > 0:
-            Piece.explore_upper_left_diagonal(self, board)
-        if self.row < 7 and self.col < 7:
-            Piece.explore_lower_right_diagonal(self, board)
-        if self.row < 7 and self.col > 0:
-            Piece.explore_lower_left_diagonal(self, board)
-
-        if self.row > 0:
-            Piece.explore_up(self, board)
-        if self.row < 7:
-            Piece.explore_down(self, board)
-        if self.col < 7:
-            Piece.explore_right(self, board)
-        if self.col > 0:
-            Piece.explore_left(self, board)
+        for step in _DIAGONAL_STEPS + _ORTHOGONAL_STEPS:
+            self.explore_ray(mailbox, moves, step)
 
 
 class King(Piece):
+    code = 6
+
     def __init__(self, color: int):
         if color is WHITE:
             row = 7
@@ -606,46 +974,223 @@ class King(Piece):
         self.col = new_col
         self.can_castle = False
 
-    def calculate_possible_moves(self, board: [[Piece]]) -> None:
+    def calculate_possible_moves(self, board: [[Piece]], mailbox: bytearray, moves: array) -> None:
         """
         Kings only have 8 normal moves like Knights, but castling is a unique which must be handled here
         :param board: [[Piece or None]]
+        :param mailbox: mailbox board of piece codes
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
-        self.possible_moves.clear()
-        possibles = {(self.row + 1, self.col - 1), (self.row - 1, self.col - 1),
-                     (self.row + 1, self.col + 1), (self.row - 1, self.col + 1),
-                     (self.row, self.col - 1), (self.row, self.col + 1),
-                     (self.row - 1, self.col), (self.row + 1, self.col)}
-        for row, col in possibles:
-            if _in_bounds(row, col):
-                if _is_space_empty(board, row, col) or board[row][col].color is not self.color:
-                    self.add_move_to_possibles(board, row, col)
+        self.explore_steps(mailbox, moves, _DIAGONAL_STEPS + _ORTHOGONAL_STEPS)
 
         if self.can_castle:
-            self._explore_castles(board)
+            self._explore_castles(board, moves)
 
-    def _explore_castles(self, board: [[Piece]]) -> None:
+    def _explore_castles(self, board: [[Piece]], moves: array) -> None:
         """
         If this can King can castle, attempt to add the castle to the possible moves
-        This only adds the Kings 2-space jump to the move dictionary
+        This only adds the Kings 2-space jump to the move list
         GameState must use _complete_castle() to move the corresponding Rook
         :param board: [[Piece or None]]
+        :param moves: array('H') to append the packed moves to
         :return: None
         """
+        origin = self.row * 8 + self.col
         if isinstance(board[self.row][7], Rook) and board[self.row][7].can_castle:
             if _is_space_empty(board, self.row, 5) and _is_space_empty(board, self.row, 6):
-                self.add_move_to_possibles(board, self.row, 6)
+                moves.append(origin | (self.row * 8 + 6) << 6 | MOVE_KING_CASTLE << 12)
 
         if isinstance(board[self.row][0], Rook) and board[self.row][0].can_castle:
             if _is_space_empty(board, self.row, 1) and _is_space_empty(board, self.row, 2) \
                     and _is_space_empty(board, self.row, 3):
-                self.add_move_to_possibles(board, self.row, 2)
+                moves.append(origin | (self.row * 8 + 2) << 6 | MOVE_QUEEN_CASTLE << 12)
+
+
+_PIECE_TYPES = {piece_type.code: piece_type for piece_type in (Pawn, Knight, Bishop, Rook, Queen, King)}
+_PIECE_LETTERS = {Pawn: 'P', Knight: 'N', Bishop: 'B', Rook: 'R', Queen: 'Q', King: 'KG'}
+_SERIAL_VERSION = 1
+_SERIAL_HEADER = struct.Struct('<BBBBBHHQ')  # version, black to move, queen counts, status, clocks, flag bits
+_STATUS_UNKNOWN = 0x80
+SERIALIZED_SIZE = _SERIAL_HEADER.size + 64
+_LAZY_ATTRIBUTES = frozenset(('_moves', 'check', 'both_checked', 'mate', 'stalemate'))
+_DIAGONAL_STEPS = (-9, -11, 11, 9)
+_ORTHOGONAL_STEPS = (-10, 10, 1, -1)
+_KNIGHT_STEPS = (8, -12, 12, -8, 19, 21, -21, -19)
+MAILBOX_SQUARES = tuple(21 + (square >> 3) * 10 + (square & 7) for square in range(64))  # Of each packed move square
+# Packed move to square bits of each mailbox square
+_TO_BITS = [MAILBOX_SQUARES.index(square) << 6 if square in MAILBOX_SQUARES else 0 for square in range(120)]
+
 
+def _to_mailbox(row: int, col: int) -> int:
+    """Convert (row, col) to a mailbox square"""
+    return 21 + row * 10 + col
 
-def _in_bounds(row: int, col: int) -> bool:
-    """Check to see if these coordiantes are in 8x8 range"""
-    return row in range(8) and col in range(8)
+
+def _empty_mailbox() -> bytearray:
+    """A mailbox board with no Pieces on it, only the OFFBOARD border"""
+    mailbox = bytearray([OFFBOARD]) * 120
+    for row in range(8):
+        mailbox[_to_mailbox(row, 0):_to_mailbox(row, 8)] = bytes(8)
+    return mailbox
+
+
+def _own_bits(color: int) -> int:
+    """The color bit of piece codes for this color"""
+    return WHITE_BIT if color is WHITE else BLACK_BIT
+
+
+def _is_square_attacked(mailbox: bytearray, square: int, by_color: int) -> bool:
+    """
+    Check to see if any Piece of by_color attacks this mailbox square
+    :param mailbox: mailbox board of piece codes
+    :param square: mailbox square
+    :param by_color: color of the attackers
+    :return: bool
+    """
+    color_bit = _own_bits(by_color)
+    pawn = Pawn.code | color_bit
+    if mailbox[square + 10 * by_color - 1] == pawn or mailbox[square + 10 * by_color + 1] == pawn:
+        return True  # White Pawns attack upwards, so they sit one row below the square
+
+    knight = Knight.code | color_bit
+    for step in _KNIGHT_STEPS:
+        if mailbox[square + step] == knight:
+            return True
+
+    king = King.code | color_bit
+    queen = Queen.code | color_bit
+    for steps, slider in ((_DIAGONAL_STEPS, Bishop.code | color_bit), (_ORTHOGONAL_STEPS, Rook.code | color_bit)):
+        for step in steps:
+            target = square + step
+            if mailbox[target] == king:
+                return True
+            while mailbox[target] == EMPTY:
+                target += step
+            if mailbox[target] == slider or mailbox[target] == queen:
+                return True
+    return False
+
+
+def _least_valuable_attacker(mailbox: bytearray, square: int, by_color: int) -> int:
+    """
+    Find the cheapest Piece of by_color attacking this mailbox square
+    :param mailbox: mailbox board of piece codes
+    :param square: mailbox square
+    :param by_color: color of the attackers
+    :return: mailbox square of the attacker, or 0 if there is none
+    """
+    color_bit = _own_bits(by_color)
+    for source in (square + 10 * by_color - 1, square + 10 * by_color + 1):
+        if mailbox[source] == Pawn.code | color_bit:
+            return source
+    for step in _KNIGHT_STEPS:
+        if mailbox[square + step] == Knight.code | color_bit:
+            return square + step
+
+    best_square, best_code = 0, OFFBOARD
+    for steps, slider in ((_DIAGONAL_STEPS, Bishop.code), (_ORTHOGONAL_STEPS, Rook.code)):
+        for step in steps:
+            target = square + step
+            if mailbox[target] == King.code | color_bit:
+                code = King.code
+            else:
+                while mailbox[target] == EMPTY:
+                    target += step
+                if mailbox[target] != slider | color_bit and mailbox[target] != Queen.code | color_bit:
+                    continue
+                code = mailbox[target] & 7
+            if code < best_code:
+                best_square, best_code = target, code
+    return best_square
+
+
+def _piece_to_byte(piece: Piece) -> int:
+    """Pack a Piece's type, color and name number into one byte: bits 0-2 code, bit 3 black, bits 4-7 number"""
+    number = 0 if isinstance(piece, King) else int(piece.name[2:])
+    return piece.code | (8 if piece.color is BLACK else 0) | number << 4
+
+
+def _piece_from_byte(code: int, row: int, col: int, flag: bool) -> Piece:
+    """
+    Rebuild a Piece packed by _piece_to_byte()
+    :param code: packed byte
+    :param row: row of the Piece
+    :param col: column of the Piece
+    :param flag: en passant for Pawns, can_castle for Rooks and Kings
+    :return: Piece
+    """
+    piece_type = _PIECE_TYPES[code & 7]
+    color = BLACK if code & 8 else WHITE
+    letter = _PIECE_LETTERS[piece_type]
+    name = ('B' if color is BLACK else 'W') + letter + ('' if piece_type is King else str(code >> 4))
+    piece = object.__new__(piece_type)
+    Piece.__init__(piece, row, col, color, name)
+    if piece_type is Pawn:
+        piece.en_passant = flag
+    elif piece_type is Rook or piece_type is King:
+        piece.can_castle = flag
+    return piece
+
+
+def pack_move(piece: Piece, row: int, col: int, capture: 'Piece or None') -> int:
+    """
+    Pack one of a Piece's possible moves into a 16-bit int
+    :param piece: Piece to move
+    :param row: row to move to
+    :param col: column to move to
+    :param capture: Piece to capture or None
+    :return: packed move
+    """
+    flags = MOVE_QUIET
+    if capture is not None:
+        flags = MOVE_EN_PASSANT if capture.row != row else MOVE_CAPTURE
+    if isinstance(piece, Pawn):
+        if row == 0 or row == 7:
+            flags |= MOVE_PROMOTION | PROMOTE_TO_QUEEN
+        elif abs(row - piece.row) == 2:
+            flags = MOVE_DOUBLE_PAWN_PUSH
+    elif isinstance(piece, King) and abs(col - piece.col) == 2:
+        flags = MOVE_KING_CASTLE if col == 6 else MOVE_QUEEN_CASTLE
+    return (piece.row * 8 + piece.col) | ((row * 8 + col) << 6) | (flags << 12)
+
+
+def encode_move(game_state: GameState, move: (Piece, int, int)) -> int:
+    """
+    Convert a (Piece, row, col) move, as used by the console, into a packed move
+    :param game_state: GameState the move belongs to
+    :param move: (Piece to move, row, col)
+    :return: packed move
+    """
+    piece, row, col = move
+    return pack_move(piece, row, col, game_state.all_possible_moves[piece][(row, col)])
+
+
+def decode_move(game_state: GameState, move: int) -> (Piece, int, int):
+    """
+    Convert a packed move back into the (Piece, row, col) format used by the console
+    :param game_state: GameState the move belongs to
+    :param move: packed move
+    :return: (Piece to move, row, col)
+    """
+    piece, row, col, _ = game_state._unpack_move(move)
+    return piece, row, col
+
+
+def perft(game_state: GameState, depth: int) -> int:
+    """
+    Count the leaf positions reachable in exactly depth moves, to check and time move generation
+    :param game_state: GameState to start from (left untouched)
+    :param depth: number of moves to look ahead
+    :return: number of leaf positions
+    """
+    moves = game_state.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        nodes += perft(game_state.child(move), depth - 1)
+    return nodes
 
 
 def _is_space_occupied(board: [[Piece]], row: int, col: int) -> bool:
@@ -658,14 +1203,104 @@ def _is_space_empty(board: [[Piece]], row: int, col: int) -> bool:
     return not _is_space_occupied(board, row, col)
 
 
-def _get_equivalent_piece(piece: Piece, game_state: GameState) -> Piece:
+def _build_zobrist_keys() -> ({tuple: int}, {(int, int): int}, int):
+    """
+    Random 64-bit keys used by GameState.position_hash()
+    Seeded so that hashes are the same from one run to the next
+    :return: ({(Piece class, color, row, col): key}, {(row, col): flag key}, turn key)
+    """
+    rng = random.Random(0x5EED)
+    piece_keys = dict()
+    for piece_type in (Pawn, Knight, Bishop, Rook, Queen, King):
+        for color in (WHITE, BLACK):
+            for row in range(8):
+                for col in range(8):
+                    piece_keys[(piece_type, color, row, col)] = rng.getrandbits(64)
+    flag_keys = {(row, col): rng.getrandbits(64) for row in range(8) for col in range(8)}
+    return piece_keys, flag_keys, rng.getrandbits(64)
+
+
+_ZOBRIST_PIECES, _ZOBRIST_FLAGS, _ZOBRIST_TURN = _build_zobrist_keys()
+
+
+# Methods timed by enable_instrumentation(). Timing works by setting wrappers onto the classes, and
+# disable_instrumentation() puts the original functions back, so the game logic runs unwrapped while it is off.
+# The lookahead tries each move on the mailbox instead of deep-copying the GameState, so _is_move_safe() counts
+# those trial moves
+_INSTRUMENTED_METHODS = ((GameState, 'execute_move'), (GameState, 'child'), (GameState, '_update_possible_moves'),
+                         (GameState, '_lookahead_for_check'), (GameState, '_is_move_safe'),
+                         (GameState, '_check_for_check'), (GameState, '_check_for_mate'),
+                         (GameState, '_check_for_stalemate')) + \
+                        tuple((piece_type, 'calculate_possible_moves') for piece_type in _PIECE_TYPES.values())
+_instrumentation = {'{}.{}'.format(owner.__name__, name): [0, 0.0] for owner, name in _INSTRUMENTED_METHODS}
+_original_methods = dict()  # {(class, method name): original function} while instrumentation is on
+
+
+def enable_instrumentation() -> None:
+    """
+    Count and time the hot methods of GameState and the Pieces by wrapping them
+    :return: None
+    """
+    if _original_methods:
+        return
+    for owner, name in _INSTRUMENTED_METHODS:
+        _original_methods[(owner, name)] = owner.__dict__[name]
+        setattr(owner, name, _timed(owner.__dict__[name], _instrumentation['{}.{}'.format(owner.__name__, name)]))
+
+
+def disable_instrumentation() -> None:
+    """Put the original methods back, keeping the counts so far"""
+    for (owner, name), function in _original_methods.items():
+        setattr(owner, name, function)
+    _original_methods.clear()
+
+
+def is_instrumented() -> bool:
+    """True while instrumentation is on"""
+    return bool(_original_methods)
+
+
+def reset_instrumentation() -> None:
+    """Zero every count and time"""
+    for totals in _instrumentation.values():
+        totals[0], totals[1] = 0, 0.0
+
+
+def instrumentation_stats() -> {str: dict}:
+    """
+    Snapshot of the counts and times. Times include the time spent in any instrumented methods called inside
+    :return: {'Class.method': {'calls': int, 'seconds': float}}
+    """
+    return {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in _instrumentation.items()}
+
+
+def instrumentation_report() -> str:
+    """
+    The counts and times as a table, slowest first, e.g. to print at the end of a game
+    :return: str
+    """
+    lines = ['{:<40} {:>10} {:>10} {:>10}'.format('method', 'calls', 'total ms', 'us/call')]
+    for name, (calls, seconds) in sorted(_instrumentation.items(), key=lambda item: -item[1][1]):
+        if calls:
+            lines.append('{:<40} {:>10} {:>10.1f} {:>10.1f}'.format(name, calls, seconds * 1e3, seconds / calls * 1e6))
+    return '\n'.join(lines)
+
+
+def _timed(function, totals: list):
     """
-    Given a certain Piece, obtain that Piece's doppleganger from an alternative GameState
-    Simply finds the alternative piece using piece.name
-    :param piece: Piece given
-    :param game_state: The alternative GameState
-    :return: the initial Piece's equal piece that occupies the alternative GameState
+    Wrap a function so that every call adds to totals
+    :param function: function to wrap
+    :param totals: [calls, seconds]
+    :return: the wrapped function
     """
-    for bizarro_piece in game_state.pieces:
-        if piece.name == bizarro_piece.name:
-            return bizarro_piece
+    perf_counter = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            totals[0] += 1
+            totals[1] += perf_counter() - start
+    wrapper.__name__, wrapper.__doc__, wrapper.__wrapped__ = function.__name__, function.__doc__, function
+    return wrapper
@@ -0,0 +1,206 @@
+# Kian Farsany
+# Chess
+# Opt-in sampling profiler for the AI, writing collapsed stacks for flame graphs
+
+import argparse
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import ai
+import game_logic
+
+DEFAULT_INTERVAL = 0.005  # Seconds between samples
+# Functions of ai.py that count as evaluation in breakdown(); everything else in ai.py counts as search
+EVALUATION_FUNCTIONS = frozenset(('_heuristic', '_simple_eval', '_pawn_structure'))
+_GAME_LOGIC_FILE = os.path.basename(game_logic.__file__)
+_AI_FILE = os.path.basename(ai.__file__)
+
+
+class SamplingProfiler:
+    """
+    Records the call stacks of the threads inside sampling() at a fixed interval from a background thread
+    Samples are kept as collapsed stacks: {(outermost frame, ..., innermost frame): samples}
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._targets = Counter()  # {thread id: how many sampling() blocks it is inside}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+
+    @contextmanager
+    def sampling(self):
+        """
+        Sample the calling thread for as long as the with block runs; blocks may nest
+        :return: context manager
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            self._targets[ident] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._targets[ident] -= 1
+                if not self._targets[ident]:
+                    del self._targets[ident]
+
+    def _run(self) -> None:
+        """Sampler thread: record every target thread's stack, then sleep; idles while there are no targets"""
+        while True:
+            with self._lock:
+                while not self._targets:
+                    self._wake.wait()
+                targets = list(self._targets)
+            frames = sys._current_frames()
+            stacks = [_collapse(frames[ident]) for ident in targets if ident in frames]
+            del frames
+            with self._lock:
+                self.stacks.update(stacks)
+                self.samples += len(stacks)
+                self._wake.wait(self.interval)
+
+    def reset(self) -> None:
+        """Forget every sample so far"""
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    def collapsed(self) -> str:
+        """
+        Samples in collapsed-stack format, one "outer;...;inner count" line per stack, as flamegraph.pl
+        and speedscope read them
+        :return: str
+        """
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        return '\n'.join('{} {}'.format(';'.join(stack), count) for stack, count in stacks)
+
+    def write(self, path: str) -> None:
+        """
+        Write collapsed() to a file
+        :param path: output file
+        :return: None
+        """
+        with open(path, 'w') as output:
+            output.write(self.collapsed() + '\n')
+
+    def breakdown(self) -> {str: float}:
+        """
+        Share of the samples in move generation (game_logic.py), evaluation (see EVALUATION_FUNCTIONS) and the
+        rest of the search, going by the innermost frame in either module
+        :return: {'move generation': fraction, 'evaluation': fraction, 'search': fraction, 'other': fraction}
+        """
+        shares = dict.fromkeys(('move generation', 'evaluation', 'search', 'other'), 0.0)
+        with self._lock:
+            stacks = list(self.stacks.items())
+        total = sum(count for _, count in stacks)
+        for stack, count in stacks:
+            shares[_category(stack)] += count / total
+        return shares
+
+
+def _collapse(frame) -> (str,):
+    """
+    Stack of a frame as labels, outermost first
+    :param frame: innermost frame
+    :return: ('file.py:function', ...)
+    """
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+def _category(stack: (str,)) -> str:
+    """breakdown() category of a collapsed stack"""
+    for label in reversed(stack):
+        file_name, function = label.split(':', 1)
+        if file_name == _GAME_LOGIC_FILE:
+            return 'move generation'
+        if file_name == _AI_FILE:
+            return 'evaluation' if function in EVALUATION_FUNCTIONS else 'search'
+    return 'other'
+
+
+_profiler = None  # SamplingProfiler while profiling is on
+_original_search = None  # ai.AI._search while profiling is on
+
+
+def enable_profiling(interval: float = DEFAULT_INTERVAL) -> SamplingProfiler:
+    """
+    Sample every AI search, whether from AI.make_move() or from a worker thread of AI.start_search(),
+    by wrapping AI._search until disable_profiling()
+    :param interval: seconds between samples
+    :return: the SamplingProfiler collecting the samples
+    """
+    global _profiler, _original_search
+    if _profiler is None:
+        _profiler = SamplingProfiler(interval)
+        _original_search = ai.AI._search
+        profiler, search = _profiler, _original_search
+
+        def sampled_search(*args, **kwargs):
+            with profiler.sampling():
+                return search(*args, **kwargs)
+        sampled_search.__name__, sampled_search.__doc__, sampled_search.__wrapped__ = \
+            search.__name__, search.__doc__, search
+        ai.AI._search = sampled_search
+    return _profiler
+
+
+def disable_profiling() -> 'SamplingProfiler or None':
+    """
+    Put AI._search back
+    :return: the SamplingProfiler that collected the samples, or None if profiling was off
+    """
+    global _profiler, _original_search
+    profiler = _profiler
+    if profiler is not None:
+        ai.AI._search = _original_search
+        _profiler = _original_search = None
+    return profiler
+
+
+def is_profiling() -> bool:
+    """True while profiling is on"""
+    return _profiler is not None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the AI playing itself and write collapsed stacks")
+    parser.add_argument('output', help="collapsed-stack file, e.g. for flamegraph.pl")
+    parser.add_argument('--moves', type=int, default=10, help="AI moves to profile")
+    parser.add_argument('--random-plies', type=int, default=8, help="random moves before profiling starts")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    rng = random.Random(arguments.seed)
+    game_state = game_logic.GameState()
+    for _ in range(arguments.random_plies):
+        game_state.execute_move(rng.choice(game_state.legal_moves()))
+    player = ai.AI()
+    sampler = enable_profiling(arguments.interval)
+    for _ in range(arguments.moves):
+        if game_state.mate or game_state.stalemate:
+            break
+        game_state.execute_move(player.make_move(game_state))
+    disable_profiling()
+    sampler.write(arguments.output)
+    print("{} samples written to {}".format(sampler.samples, arguments.output))
+    for category, share in sampler.breakdown().items():
+        print("{:<16} {:>6.1%}".format(category, share))
@@ -0,0 +1,272 @@
+# Kian Farsany
+# Chess
+# Texel tuning of the piece values and piece-square tables over labeled positions
+
+import argparse
+import json
+import math
+import os
+import random
+import numpy as np
+import ai
+import batch_eval
+import game_logic
+
+RECORD_SIZE = game_logic.SERIALIZED_SIZE + 1  # A position packed by GameState.to_bytes(), then the game's result
+_RESULT_BYTES = {game_logic.BLACK: 0, 0: 1, game_logic.WHITE: 2}  # Winner (0 for a draw) -> result byte
+PIECE_TYPES = batch_eval.PLANE_TYPES
+# Features: for each Piece type, White's minus Black's Pieces on each square (Black's squares mirrored),
+# then White's minus Black's count of each Piece type. The evaluation is their dot product with the weights
+FEATURE_COUNT = len(PIECE_TYPES) * 64 + len(PIECE_TYPES)
+_MATERIAL = len(PIECE_TYPES) * 64  # Index of the first material feature
+_CHUNK_SIZE = 16384  # Positions held in memory at once
+
+
+def write_game(stream, positions: [game_logic.GameState], winner: int) -> None:
+    """
+    Append a game's positions, each labeled with the game's result, to a positions file
+    :param stream: binary file
+    :param positions: [GameState]
+    :param winner: game_logic.WHITE, game_logic.BLACK, or 0 for a draw
+    :return: None
+    """
+    result = bytes((_RESULT_BYTES[winner],))
+    for position in positions:
+        stream.write(position.to_bytes() + result)
+
+
+def self_play(path: str, games: int, random_plies: int = 8, max_moves: int = 200, node_limit: int = 1000,
+              seed: int = 0) -> int:
+    """
+    Play the engine against itself at depth 1 and append every position after the opening to a positions file
+    Each game opens with random moves so that the games differ; games drawn by stalemate, repetition or the
+    fifty-move rule, and games that reach max_moves, count as draws
+    :param path: positions file
+    :param games: how many games to play
+    :param random_plies: how many random moves open each game
+    :param max_moves: plies after which a game is called a draw
+    :param node_limit: nodes per move
+    :param seed: random seed
+    :return: how many positions were written
+    """
+    rng = random.Random(seed)
+    transposition_table, pawn_cache = ai.TranspositionTable(), ai.PawnCache()
+    written = 0
+    with open(path, 'ab') as stream:
+        for _ in range(games):
+            game_state = game_logic.GameState()
+            positions = []
+            winner = 0
+            for ply in range(max_moves):
+                if game_state.mate:
+                    winner = -game_state.check
+                    break
+                if game_state.is_draw():
+                    break
+                if ply < random_plies:
+                    move = rng.choice(game_state.legal_moves())
+                else:
+                    search = ai.Search(transposition_table, node_limit=node_limit, pawn_cache=pawn_cache)
+                    move = search.best_move(game_state, 1)
+                    positions.append(game_state.snapshot())
+                game_state.execute_move(move)
+            write_game(stream, positions, winner)
+            written += len(positions)
+    return written
+
+
+def build_features(positions_path: str, data_dir: str) -> int:
+    """
+    Stream a positions file into memory-mapped arrays in data_dir: features.npy (int8, N x FEATURE_COUNT),
+    offsets.npy (the pawn structure terms, which aren't tuned) and results.npy (1 White won, 0.5 draw, 0 Black won)
+    Only _CHUNK_SIZE positions are in memory at a time, however many the file holds
+    :param positions_path: file written by write_game()
+    :param data_dir: directory for the arrays
+    :return: how many positions there are
+    """
+    records = np.memmap(positions_path, dtype=np.uint8, mode='r')
+    if len(records) % RECORD_SIZE:
+        raise ValueError('{} is not a positions file'.format(positions_path))
+    records = records.reshape(-1, RECORD_SIZE)
+    count = len(records)
+    os.makedirs(data_dir, exist_ok=True)
+    features = np.lib.format.open_memmap(os.path.join(data_dir, 'features.npy'), mode='w+', dtype=np.int8,
+                                         shape=(count, FEATURE_COUNT))
+    offsets = np.lib.format.open_memmap(os.path.join(data_dir, 'offsets.npy'), mode='w+', dtype=np.int32,
+                                        shape=(count,))
+    results = np.lib.format.open_memmap(os.path.join(data_dir, 'results.npy'), mode='w+', dtype=np.float32,
+                                        shape=(count,))
+    for start in range(0, count, _CHUNK_SIZE):
+        chunk = records[start:start + _CHUNK_SIZE]
+        codes, _ = batch_eval.from_packed(chunk[:, :game_logic.SERIALIZED_SIZE].tobytes())
+        features[start:start + len(chunk)] = _features(codes)
+        offsets[start:start + len(chunk)] = batch_eval._pawn_structure(codes.reshape(-1, 8, 8))
+        results[start:start + len(chunk)] = chunk[:, game_logic.SERIALIZED_SIZE] / 2
+    features.flush()
+    offsets.flush()
+    results.flush()
+    return count
+
+
+def _features(codes: np.ndarray) -> np.ndarray:
+    """
+    Features of a chunk of positions
+    :param codes: (N, 64) piece codes
+    :return: (N, FEATURE_COUNT) int8
+    """
+    features = np.zeros((len(codes), FEATURE_COUNT), dtype=np.int8)
+    for index, piece_type in enumerate(PIECE_TYPES):
+        white = codes == piece_type.code | game_logic.WHITE_BIT
+        black = (codes == piece_type.code | game_logic.BLACK_BIT).reshape(-1, 8, 8)[:, ::-1].reshape(-1, 64)
+        features[:, index * 64:(index + 1) * 64] = white.astype(np.int8) - black
+        features[:, _MATERIAL + index] = white.sum(axis=1) - black.sum(axis=1)
+    return features
+
+
+def current_weights(weights: ai.Weights = ai.DEFAULT_WEIGHTS) -> np.ndarray:
+    """
+    The piece-square tables and piece values of an evaluation, as a weight vector
+    :param weights: ai.Weights, the defaults unless given
+    :return: (FEATURE_COUNT,) float64
+    """
+    vector = np.zeros(FEATURE_COUNT)
+    for index, piece_type in enumerate(PIECE_TYPES):
+        vector[index * 64:(index + 1) * 64] = weights.piece_square_tables[piece_type]
+        vector[_MATERIAL + index] = weights.piece_values[piece_type]
+    return vector
+
+
+def _load(data_dir: str) -> (np.ndarray, np.ndarray, np.ndarray):
+    """Memory-map the arrays build_features() wrote"""
+    return tuple(np.load(os.path.join(data_dir, name + '.npy'), mmap_mode='r')
+                 for name in ('features', 'offsets', 'results'))
+
+
+def _sigmoid(scores: np.ndarray, scale: float) -> np.ndarray:
+    """Expected result (from White's point of view) of positions with these scores"""
+    return 1 / (1 + np.power(10.0, -scale * scores / 400))
+
+
+def error(data_dir: str, weights: np.ndarray, scale: float) -> float:
+    """
+    Mean squared difference between the game results and the results the evaluation predicts
+    :param data_dir: directory written by build_features()
+    :param weights: (FEATURE_COUNT,) weights
+    :param scale: sigmoid scale
+    :return: float
+    """
+    features, offsets, results = _load(data_dir)
+    total = 0.0
+    for start in range(0, len(results), _CHUNK_SIZE):
+        stop = start + _CHUNK_SIZE
+        scores = features[start:stop].astype(np.float32) @ weights + offsets[start:stop]
+        total += float(((results[start:stop] - _sigmoid(scores, scale)) ** 2).sum())
+    return total / len(results)
+
+
+def fit_scale(data_dir: str, weights: np.ndarray) -> float:
+    """
+    The sigmoid scale that best fits the results to the current evaluation, by golden section search
+    :param data_dir: directory written by build_features()
+    :param weights: (FEATURE_COUNT,) weights
+    :return: float
+    """
+    return _fit_scale(data_dir, weights)[0]
+
+
+def _fit_scale(data_dir: str, weights: np.ndarray, steps: int = 20) -> (float, float):
+    """
+    fit_scale() and the error at the scale it found
+    Each step keeps the interior point that survives, so it costs a single pass over the features
+    :return: (scale, error)
+    """
+    low, high = 0.1, 3.0
+    ratio = (math.sqrt(5) - 1) / 2
+    left, right = high - ratio * (high - low), low + ratio * (high - low)
+    left_error, right_error = error(data_dir, weights, left), error(data_dir, weights, right)
+    for _ in range(steps):
+        if left_error < right_error:
+            high, right, right_error = right, left, left_error
+            left = high - ratio * (high - low)
+            left_error = error(data_dir, weights, left)
+        else:
+            low, left, left_error = left, right, right_error
+            right = low + ratio * (high - low)
+            right_error = error(data_dir, weights, right)
+    return (left, left_error) if left_error < right_error else (right, right_error)
+
+
+def tune(data_dir: str, epochs: int = 20, learning_rate: float = 2.0, scale: float = None,
+         seed: int = 0) -> np.ndarray:
+    """
+    Minimise the sigmoid error of the evaluation with Adam steps over mini-batches of the memory-mapped features
+    :param data_dir: directory written by build_features()
+    :param epochs: passes over every position
+    :param learning_rate: largest step of a weight, in centipawns
+    :param scale: sigmoid scale, or None to fit it to the current weights first
+    :param seed: random seed for the order of the mini-batches
+    :return: (FEATURE_COUNT,) tuned weights
+    """
+    features, offsets, results = _load(data_dir)
+    weights = current_weights()
+    if scale is None:
+        scale = fit_scale(data_dir, weights)
+    slope = scale * math.log(10) / 400
+    rng = np.random.default_rng(seed)
+    mean, variance = np.zeros(FEATURE_COUNT), np.zeros(FEATURE_COUNT)
+    step = 0
+    for _ in range(epochs):
+        for start in rng.permutation(range(0, len(results), _CHUNK_SIZE)):
+            stop = start + _CHUNK_SIZE
+            batch = features[start:stop].astype(np.float32)
+            predicted = _sigmoid(batch @ weights + offsets[start:stop], scale)
+            gradient = batch.T @ (2 * (predicted - results[start:stop]) * predicted * (1 - predicted) * slope)
+            gradient /= len(batch)
+            step += 1
+            mean = 0.9 * mean + 0.1 * gradient
+            variance = 0.999 * variance + 0.001 * gradient ** 2
+            weights -= learning_rate * (mean / (1 - 0.9 ** step)) / (np.sqrt(variance / (1 - 0.999 ** step)) + 1e-8)
+    return weights
+
+
+def save_weights(weights: np.ndarray, path: str = ai.WEIGHTS_FILE) -> None:
+    """
+    Write weights, rounded to whole centipawns, to a JSON file that ai.load_weights() reads
+    :param weights: (FEATURE_COUNT,) weights
+    :param path: where to write them
+    :return: None
+    """
+    rounded = np.rint(weights).astype(int).tolist()
+    output = {'piece_values': {piece_type.__name__: rounded[_MATERIAL + index]
+                               for index, piece_type in enumerate(PIECE_TYPES) if piece_type is not game_logic.King},
+              'piece_square_tables': {piece_type.__name__: rounded[index * 64:(index + 1) * 64]
+                                      for index, piece_type in enumerate(PIECE_TYPES)}}
+    with open(path, 'w') as weights_file:
+        json.dump(output, weights_file, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Texel tuning of the evaluation weights")
+    commands = parser.add_subparsers(dest='command', required=True)
+    play = commands.add_parser('selfplay', help="append self-play games to a positions file")
+    play.add_argument('positions')
+    play.add_argument('--games', type=int, default=100)
+    play.add_argument('--seed', type=int, default=0)
+    features_command = commands.add_parser('features', help="build memory-mapped features from a positions file")
+    features_command.add_argument('positions')
+    features_command.add_argument('data_dir')
+    tune_command = commands.add_parser('tune', help="tune the weights and write the weights file")
+    tune_command.add_argument('data_dir')
+    tune_command.add_argument('--epochs', type=int, default=20)
+    tune_command.add_argument('--output', default=ai.WEIGHTS_FILE)
+    arguments = parser.parse_args()
+
+    if arguments.command == 'selfplay':
+        print("Wrote", self_play(arguments.positions, arguments.games, seed=arguments.seed), "positions")
+    elif arguments.command == 'features':
+        print("Built features of", build_features(arguments.positions, arguments.data_dir), "positions")
+    else:
+        fitted_scale, fitted_error = _fit_scale(arguments.data_dir, current_weights())
+        tuned = tune(arguments.data_dir, arguments.epochs, scale=fitted_scale)
+        print("Error {:.5f} -> {:.5f}".format(fitted_error, error(arguments.data_dir, tuned, fitted_scale)))
+        save_weights(tuned, arguments.output)
@@ -2,23 +2,71 @@
 # Chess
 # GUI
 
-import game_logic
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
 import tkinter
+from collections import OrderedDict
 from PIL import ImageTk, Image
 
+# The GUI plays on the console version's game logic, against its AI
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'console'))
+import ai
+import game_logic
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+CELL_SIZE = 100  # Width and height of a square in pixels when the window opens
+MIN_CELL_SIZE = 20  # The board never shrinks below this
+PIECE_SCALE = 0.9  # Piece sprites fill this much of a square
+RESIZE_DELAY = 150  # Milliseconds a window size must hold before the board is rescaled to it
+SPRITE_SIZES = 8  # Cell sizes whose sprites stay cached
+LIGHT_SQUARE = '#ffdead'  # Dark squares are left unfilled and show the canvas background
+HIGHLIGHT = '#ffd700'  # Outline of the square of the selected Piece
+POLL_INTERVAL = 16  # Milliseconds between checks for engine results while the engine is busy
+FRAME_BUDGET = 0.008  # Seconds of each poll the main thread may spend handling engine results
+SPINNER = '|/-\\'
+
 
 class Chess:
-    def __init__(self):
+    def __init__(self, ai_color: 'int or None' = game_logic.BLACK):
         self._root_window = tkinter.Tk()
 
         self.game_state = game_logic.GameState()
+        self._ai_color = ai_color  # Color the AI plays, or None for two players
+        self._ai = ai.AI() if ai_color is not None else None
 
         self._canvas = tkinter.Canvas(
             master=self._root_window,
-            width=800, height=800,
-            background='#9f6934')
-        self._canvas.grid(row=0, column=0)
+            width=8 * CELL_SIZE, height=8 * CELL_SIZE,
+            background='#9f6934', highlightthickness=0)
+        self._canvas.grid(row=0, column=0, sticky='nsew')
+        self._canvas.bind('<Button-1>', self._on_click)
+        self._canvas.bind('<Configure>', self._on_configure)
+        self._status = tkinter.Label(master=self._root_window, anchor='w')
+        self._status.grid(row=1, column=0, sticky='ew')
+        self._sprites = SpriteCache()
+        self._cell_size = CELL_SIZE
+        self._images = self._sprites.get(self._cell_size)  # {(Piece type, color): PhotoImage} at the current size
+        self._pending_resize = None  # after() id of the debounced rescale, None if none is waiting
+        self._square_items = dict()  # {(row, col): canvas rectangle}
+        self._piece_items = dict()  # {(row, col): (canvas image of the Piece on that square, its sprite key)}
+        self._selected = None  # Piece the player has picked up
+        self._highlight = None  # Canvas rectangle around the selected Piece
+        #############################################
+        # Engine work runs on a worker thread, which owns self.game_state while it is busy #
+        self._jobs = queue.Queue()  # work(report) functions for the worker
+        self._results = queue.Queue()  # ('progress', text), ('done', result) or ('error', exception)
+        self._on_done = None  # Called on the Tk thread with the result of the current job
+        self._busy_since = None  # perf_counter() when the current job started, None while the engine is idle
+        self._progress = ''  # Latest text the current job reported
+        threading.Thread(target=self._work, name='engine', daemon=True).start()
+        #############################################
         self._draw_board()
+        self._show_status()
+        self._after_move(set())  # The AI opens if it plays White
 
         self._root_window.rowconfigure(0, weight=1)
         self._root_window.columnconfigure(0, weight=1)
@@ -26,28 +74,272 @@ class Chess:
     def run(self) -> None:
         self._root_window.mainloop()
 
+    def execute_move(self, desired_move: (game_logic.Piece, int, int)) -> None:
+        """
+        Executes the given move on the GameState in the worker thread, then redraws only the squares it changed
+        :param desired_move: (Piece to move, desired row: int, desire column: int)
+        :return: None
+        """
+        changed = _changed_squares(self.game_state, desired_move)
+        self._submit(lambda report: self.game_state.execute_move(desired_move), lambda _: self._after_move(changed))
+
+    def _after_move(self, changed: {(int, int)}) -> None:
+        """
+        Redraw the squares a move changed, then let the AI reply if it is its turn
+        :param changed: {(row, col)}
+        :return: None
+        """
+        self._redraw(changed)
+        state = self.game_state
+        if self._ai is not None and state.turn is self._ai_color and not (state.mate or state.stalemate):
+            self._submit(self._ai_move, self._after_move)
+
+    def _ai_move(self, report) -> {(int, int)}:
+        """
+        Worker thread: let the AI search, reporting the best move of each completed iteration, then play its move
+        :param report: function of progress text
+        :return: {(row, col)} squares the move changed
+        """
+        state = self.game_state
+
+        def on_iteration(depth: int, score: int, line: [int]) -> None:
+            if line:
+                report('depth {}: {} ({:+.2f})'.format(depth, _move_name(state, line[0]), score / 100))
+        move = self._ai.start_search(state, on_iteration=on_iteration).result()
+        changed = _changed_squares(state, game_logic.decode_move(state, move))
+        state.execute_move(move)
+        return changed
+
+    def _submit(self, work, on_done) -> None:
+        """
+        Hand engine work to the worker thread and poll for its result, keeping the window responsive meanwhile
+        :param work: function of report(text), which shows progress such as the best move so far
+        :param on_done: function of the work's result, called on the Tk thread
+        :return: None
+        """
+        self._on_done = on_done
+        self._busy_since = time.perf_counter()
+        self._progress = ''
+        self._jobs.put(work)
+        self._root_window.after(POLL_INTERVAL, self._poll)
+
+    def _work(self) -> None:
+        """Worker thread: run each job and put its progress and result on the result queue"""
+        def report(text: str) -> None:
+            self._results.put(('progress', text))
+        while True:
+            work = self._jobs.get()
+            try:
+                self._results.put(('done', work(report)))
+            except Exception as error:
+                self._results.put(('error', error))
+
+    def _poll(self) -> None:
+        """
+        Handle what the worker has put on the result queue, for at most FRAME_BUDGET seconds,
+        and keep polling until the job is done
+        :return: None
+        """
+        deadline = time.perf_counter() + FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                kind, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self._progress = value
+                continue
+            self._busy_since = None
+            if kind == 'error':
+                self._status.configure(text='Engine error: {}'.format(value))
+            else:
+                self._on_done(value)
+            return
+        self._show_status()
+        self._root_window.after(POLL_INTERVAL, self._poll)
+
+    def _on_click(self, event: tkinter.Event) -> None:
+        """
+        Pick up a Piece of the side to move, or put the picked up Piece down on one of its possible moves
+        Clicks are ignored while the engine is busy, since the worker owns the GameState then
+        :param event: mouse click on the canvas
+        :return: None
+        """
+        if self._busy_since is not None or self.game_state.mate or self.game_state.stalemate:
+            return
+        row, col = event.y // self._cell_size, event.x // self._cell_size
+        if not (0 <= row < 8 and 0 <= col < 8):
+            return
+        piece, self._selected = self._selected, None
+        if self._highlight is not None:
+            self._canvas.delete(self._highlight)
+            self._highlight = None
+        if piece is not None and (row, col) in self.game_state.all_possible_moves[piece]:
+            self.execute_move((piece, row, col))
+            return
+        square = self.game_state.board[row][col]
+        if isinstance(square, game_logic.Piece) and square.color is self.game_state.turn and square is not piece:
+            self._selected = square
+            self._highlight = self._canvas.create_rectangle(*self._square_bounds(row, col), outline=HIGHLIGHT, width=4)
+
+    def _on_configure(self, event: tkinter.Event) -> None:
+        """
+        Rescale the board once the canvas has kept a new size for RESIZE_DELAY, not on every step of a drag
+        :param event: canvas resize
+        :return: None
+        """
+        if self._pending_resize is not None:
+            self._root_window.after_cancel(self._pending_resize)
+        self._pending_resize = self._root_window.after(RESIZE_DELAY, self._resize, event.width, event.height)
+
+    def _resize(self, width: int, height: int) -> None:
+        """
+        Fit the board to a canvas of the given size: move the squares and Pieces and swap in sprites of the new size
+        Only canvas items are touched, never the GameState, so this is safe while the worker is busy
+        :param width: canvas width in pixels
+        :param height: canvas height in pixels
+        :return: None
+        """
+        self._pending_resize = None
+        cell_size = max(MIN_CELL_SIZE, min(width, height) // 8)
+        if cell_size == self._cell_size:
+            return
+        self._cell_size = cell_size
+        self._images = self._sprites.get(cell_size)
+        for (row, col), item in self._square_items.items():
+            self._canvas.coords(item, *self._square_bounds(row, col))
+        for (row, col), (item, key) in self._piece_items.items():
+            self._canvas.coords(item, (col + 0.5) * cell_size, (row + 0.5) * cell_size)
+            self._canvas.itemconfigure(item, image=self._images[key])
+        if self._highlight is not None:
+            self._canvas.coords(self._highlight, *self._square_bounds(self._selected.row, self._selected.col))
+
+    def _square_bounds(self, row: int, col: int) -> (int, int, int, int):
+        """Canvas (x0, y0, x1, y1) of a square at the current cell size"""
+        return col * self._cell_size, row * self._cell_size, (col + 1) * self._cell_size, (row + 1) * self._cell_size
+
+    def _redraw(self, squares: {(int, int)}) -> None:
+        """Redraw the given squares and the status line after a move"""
+        for row, col in squares:
+            self._draw_square(row, col)
+        self._show_status()
+
+    def _show_status(self) -> None:
+        """Show what the engine is doing, or whose turn it is and whether the game is over"""
+        state = self.game_state
+        if self._busy_since is not None:
+            elapsed = time.perf_counter() - self._busy_since
+            text = 'Thinking {} {:.1f}s {}'.format(SPINNER[int(elapsed * 10) % len(SPINNER)], elapsed, self._progress)
+        elif state.mate:
+            text = 'Checkmate! {} is the victor'.format('Black' if state.check is game_logic.WHITE else 'White')
+        elif state.stalemate:
+            text = 'Stalemate'
+        else:
+            text = '{} to move{}'.format('White' if state.turn is game_logic.WHITE else 'Black',
+                                         ', check!' if state.check else '')
+        self._status.configure(text=text)
+
     def _draw_board(self) -> None:
-        cell_width, cell_height = 100, 100
+        """Create the 64 squares once, then draw every Piece"""
         for r in range(8):
             for c in range(8):
-                x0, y0 = c * cell_width, r * cell_height
-                x1, y1 = x0 + cell_width, y0 + cell_height
-                if r % 2 == 0:
-                    if c % 2 == 0:
-                        self._canvas.create_rectangle(x0, y0, x1, y1, outline='black', fill='#ffdead')
-                    else:
-                        self._canvas.create_rectangle(x0, y0, x1, y1, outline='black')
-                else:
-                    if c % 2 == 0:
-                        self._canvas.create_rectangle(x0, y0, x1, y1, outline='black')
-                    else:
-                        self._canvas.create_rectangle(x0, y0, x1, y1, outline='black', fill='#ffdead')
-                self._draw_piece((x0+x1)/2, (y0+y1)/2, r, c, cell_width, cell_height)
-
-    def _draw_piece(self, x: int, y: int, row: int, col: int, cell_width: int, cell_height: int) -> None:
-        self.image = ImageTk.PhotoImage(Image.open("images\\w_king.jpg"))
-        self._canvas.create_image(x, y, image=self.image, anchor="center")
+                fill = LIGHT_SQUARE if (r + c) % 2 == 0 else ''
+                self._square_items[(r, c)] = self._canvas.create_rectangle(
+                    *self._square_bounds(r, c), outline='black', fill=fill)
+                self._draw_square(r, c)
+
+    def _draw_square(self, row: int, col: int) -> None:
+        """
+        Replace the Piece drawn on a square with whatever is on that square of the board now
+        :param row: row of the square
+        :param col: column of the square
+        :return: None
+        """
+        item, _ = self._piece_items.pop((row, col), (None, None))
+        if item is not None:
+            self._canvas.delete(item)
+        piece = self.game_state.board[row][col]
+        if isinstance(piece, game_logic.Piece):
+            key = (type(piece), piece.color)
+            self._piece_items[(row, col)] = self._canvas.create_image(
+                (col + 0.5) * self._cell_size, (row + 0.5) * self._cell_size, image=self._images[key],
+                anchor="center"), key
+
+
+class SpriteCache:
+    """
+    Piece sprites resampled to fit a square, made once per cell size
+    The 12 piece images are decoded once; the sprites of the SPRITE_SIZES most recently used cell sizes are kept,
+    so resizing back and forth doesn't resample them again
+    Needs a Tk root window to exist already
+    """
+
+    def __init__(self, max_sizes: int = SPRITE_SIZES):
+        self.max_sizes = max_sizes
+        self._sources = _load_images()
+        self._sprites = OrderedDict()  # {cell size: {(Piece type, color): PhotoImage}}, least recently used first
+
+    def get(self, cell_size: int) -> {(type, int): ImageTk.PhotoImage}:
+        """
+        The sprites for squares of the given size
+        :param cell_size: width and height of a square in pixels
+        :return: {(Piece type, color): PhotoImage}
+        """
+        sprites = self._sprites.get(cell_size)
+        if sprites is None:
+            side = max(1, int(cell_size * PIECE_SCALE))
+            sprites = {key: ImageTk.PhotoImage(image.resize((side, side), Image.LANCZOS))
+                       for key, image in self._sources.items()}
+            self._sprites[cell_size] = sprites
+            if len(self._sprites) > self.max_sizes:
+                self._sprites.popitem(last=False)
+        else:
+            self._sprites.move_to_end(cell_size)
+        return sprites
+
+
+def _load_images() -> {(type, int): Image.Image}:
+    """
+    Decode the 12 piece images once, e.g. images/w_king.jpg for the White King
+    :return: {(Piece type, color): PIL Image}
+    """
+    images = dict()
+    for piece_type in (game_logic.Pawn, game_logic.Knight, game_logic.Bishop, game_logic.Rook, game_logic.Queen,
+                       game_logic.King):
+        for color, prefix in ((game_logic.WHITE, 'w'), (game_logic.BLACK, 'b')):
+            path = os.path.join(IMAGES_DIR, '{}_{}.jpg'.format(prefix, piece_type.__name__.lower()))
+            with Image.open(path) as image:
+                images[(piece_type, color)] = image.convert('RGB')
+    return images
+
+
+def _move_name(game_state: game_logic.GameState, move: int) -> str:
+    """A packed move as the moving Piece's name and its destination, e.g. WN2 f3"""
+    piece, row, col = game_logic.decode_move(game_state, move)
+    return '{} {}{}'.format(piece.name, 'abcdefgh'[col], 8 - row)
+
+
+def _changed_squares(game_state: game_logic.GameState, desired_move: (game_logic.Piece, int, int)) -> {(int, int)}:
+    """
+    Squares a move will change: where the Piece moves from and to, the Rook's squares of a castle and
+    the square of a Pawn taken en passant
+    :param game_state: GameState before the move
+    :param desired_move: (Piece to move, desired row: int, desire column: int)
+    :return: {(row, col)}
+    """
+    piece, new_row, new_col = desired_move
+    changed = {(piece.row, piece.col), (new_row, new_col)}
+    captured = game_state.all_possible_moves[piece][(new_row, new_col)]
+    if isinstance(captured, game_logic.Piece):
+        changed.add((captured.row, captured.col))
+    if isinstance(piece, game_logic.King) and abs(piece.col - new_col) > 1:
+        changed.update({(piece.row, 7), (piece.row, 5)} if new_col == 6 else {(piece.row, 0), (piece.row, 3)})
+    return changed
 
 
 if __name__ == "__main__":
-    Chess().run()
+    parser = argparse.ArgumentParser(description="Play chess in a window")
+    parser.add_argument('--ai', choices=('white', 'black', 'none'), default='black',
+                        help="color the AI plays, or none for two players (default black)")
+    arguments = parser.parse_args()
+    Chess({'white': game_logic.WHITE, 'black': game_logic.BLACK, 'none': None}[arguments.ai]).run()